@@ -0,0 +1,206 @@
+# batch_runner.py
+"""
+Headless batch runner. Runs the query pipeline for every query in a file on a
+thread or process pool and writes, per query, a JSON result, the figures
+(Plotly JSON, optionally PNG) and the maps as HTML, plus a throughput summary.
+
+Usage: python batch_runner.py queries.txt --output batch_output [--workers 4] [--executor thread|process] [--png]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from corpus_store import get_state_corpus
+from instrumentation import configure_logging, percentile, registry, start_metrics_server
+from pipeline import run_query_pipeline
+from query_parser import parse_query
+
+logger = logging.getLogger(__name__)
+
+
+def load_queries(path):
+    """Returns [(query_id, query)] from a text file (one query per line) or a .jsonl file with 'query' and optional 'id'."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                queries.append((str(record.get("id", len(queries) + 1)), record["query"]))
+            else:
+                queries.append((str(len(queries) + 1), line))
+    return queries
+
+
+def _slug(text, max_length=40):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:max_length] or "query"
+
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _write_figures(figures, query_dir, png):
+    paths = []
+    png_error = None
+    for i, fig in enumerate(figures, start=1):
+        json_path = os.path.join(query_dir, f"figure_{i}.json")
+        _write_text(json_path, fig.to_json())
+        paths.append(json_path)
+        if png and png_error is None:
+            try:
+                fig.write_image(os.path.join(query_dir, f"figure_{i}.png"))
+            except Exception as e:
+                # PNG export needs kaleido; keep the JSON output either way
+                png_error = f"PNG export failed: {str(e)}"
+    return paths, png_error
+
+
+def _write_maps(map_data, comparative, query_dir):
+    if not comparative:
+        path = os.path.join(query_dir, "map.html")
+        _write_text(path, map_data.to_html())
+        return [path]
+    paths = []
+    for item in map_data:
+        if item.get("map") is None:
+            continue
+        path = os.path.join(query_dir, f"map_{_slug(item['state'])}_{item['year']}.html")
+        _write_text(path, item["map"].to_html())
+        paths.append(path)
+    return paths
+
+
+def run_query(query_id, query, output_dir, png=False):
+    """Runs one query through the pipeline, writes its outputs under output_dir and returns its result dict."""
+    start = time.perf_counter()
+    query_dir = os.path.join(output_dir, f"{query_id}_{_slug(query)}")
+    os.makedirs(query_dir, exist_ok=True)
+    plan = parse_query(query)
+    result = {
+        "id": query_id,
+        "query": query,
+        "plan": {"states": plan.state_list, "years": plan.year_dict, "metrics": plan.metric_list,
+                 "locations": [list(location) for location in plan.locations]},
+        "mistral_values": None,
+        "report": None,
+        "figures": [],
+        "maps": [],
+        "map_captions": None,
+        "errors": [],
+        "stage_seconds": {},
+    }
+
+    if not plan.states:
+        result["errors"].append("Please include a state name, a district or coordinates.")
+    for state in plan.states:
+        if get_state_corpus(state) is None:
+            result["errors"].append(f"No data file for {state}.")
+
+    if not result["errors"]:
+        try:
+            for stage, stage_result in run_query_pipeline(plan):
+                if stage == "report_chunk":
+                    continue
+                result["stage_seconds"][stage] = round(time.perf_counter() - start, 3)
+                if stage == "extraction":
+                    result["mistral_values"] = stage_result
+                elif stage == "report":
+                    result["report"] = stage_result
+                elif stage == "visualizations":
+                    if not stage_result:
+                        result["errors"].append("No visualizations generated.")
+                    result["figures"], png_error = _write_figures(stage_result, query_dir, png)
+                    if png_error:
+                        result["errors"].append(png_error)
+                elif stage == "maps":
+                    map_data, map_error, map_captions, comparative = stage_result
+                    if map_error:
+                        result["errors"].append(f"Map Error: {map_error}")
+                    elif map_data:
+                        result["maps"] = _write_maps(map_data, comparative, query_dir)
+                        result["map_captions"] = map_captions
+                elif stage == "error":
+                    result["errors"].append(stage_result[1])
+        except Exception as e:
+            result["errors"].append(f"Pipeline failed: {str(e)}")
+
+    result["status"] = "ok" if result["report"] and not result["errors"] else "error"
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(query_dir, "result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def summarize(results, wall_seconds):
+    latencies = [r["elapsed_seconds"] for r in results]
+    return {
+        "queries": len(results),
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "wall_seconds": round(wall_seconds, 3),
+        "queries_per_minute": round(len(results) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "latency_p50_seconds": percentile(latencies, 0.5),
+        "latency_p95_seconds": percentile(latencies, 0.95),
+    }
+
+
+def run_batch(queries, output_dir, workers=4, executor="thread", png=False):
+    """
+    Runs [(query_id, query)] on a pool of `workers` threads or processes.
+    Returns (results in input order, summary); both are also written to output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    start = time.perf_counter()
+    results = [None] * len(queries)
+    with pool_class(max_workers=workers) as pool:
+        futures = {pool.submit(run_query, query_id, query, output_dir, png): i
+                   for i, (query_id, query) in enumerate(queries)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                query_id, query = queries[i]
+                results[i] = {"id": query_id, "query": query, "status": "error",
+                              "errors": [f"Worker failed: {str(e)}"], "elapsed_seconds": 0.0}
+            logger.info("[%d/%d] %s: %s", sum(r is not None for r in results), len(queries), results[i]["status"],
+                        results[i]["query"])
+    summary = summarize(results, time.perf_counter() - start)
+    # Span metrics cover this process only; with the process executor they miss the workers
+    with open(os.path.join(output_dir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "metrics": registry.snapshot(), "results": results}, f, indent=2)
+    return results, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("queries", help="Text file with one query per line, or .jsonl with 'query' (and 'id') fields")
+    parser.add_argument("--output", default="batch_output")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--png", action="store_true", help="Also export figures as PNG (requires kaleido)")
+    args = parser.parse_args()
+    configure_logging()
+    start_metrics_server()
+
+    queries = load_queries(args.queries)
+    if not queries:
+        logger.error("No queries found in %s", args.queries)
+        return 1
+    _, summary = run_batch(queries, args.output, args.workers, args.executor, args.png)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
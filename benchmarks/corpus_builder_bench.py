@@ -0,0 +1,70 @@
+# benchmarks/corpus_builder_bench.py
+"""
+Runs corpus_builder against the local Earth Engine fake for every state over
+ten years, reports the round trips and wall time, and checks that the written
+corpus files round-trip through corpus_index to the values fetched from EE.
+It then rebuilds only the last year, with the year before it failing, and
+checks that no earlier cell is lost from the corpus files.
+
+Usage: python benchmarks/corpus_builder_bench.py [--ee-latency 0.5] [--years-per-request 2] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ee-latency", type=float, default=0.5, help="Seconds per getInfo round trip")
+    parser.add_argument("--years-per-request", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    faults = fakes.Faults(args.ee_latency)
+    fakes.install(ee_faults=faults)
+    with tempfile.TemporaryDirectory() as root:
+        config = fakes.use_workspace(root, "http://127.0.0.1:9", [], [])
+        for filename in config.state_corpus_files.values():
+            os.remove(os.path.join(config.CORPUS_FOLDER, filename))
+        import corpus_builder
+        from corpus_index import lookup_values
+
+        states = list(config.state_corpus_files)
+        years = corpus_builder.DEFAULT_YEARS
+        fakes.calls.reset()
+        start = time.perf_counter()
+        summary = corpus_builder.build_corpus(states, years, years_per_request=args.years_per_request,
+                                              workers=args.workers)
+        elapsed = time.perf_counter() - start
+        round_trips = fakes.calls.snapshot()
+
+        table, _ = corpus_builder.build_values(states, years)
+        indexed = lookup_values(states, {state: years for state in states}, corpus_builder.METRICS) or {}
+        mismatches = sum(1 for key, value in table.items() if indexed.get(key) != value)
+
+        # A partial rebuild over the existing corpus, with one batch failing
+        corpus_builder.build_corpus(states, years[-1:], years_per_request=1, workers=1)
+        faults.failure_rate = 1.0
+        partial = corpus_builder.build_corpus(states, years[-2:-1], years_per_request=1, workers=1)
+        faults.failure_rate = 0.0
+        indexed = lookup_values(states, {state: years for state in states}, corpus_builder.METRICS) or {}
+        lost = sum(1 for key, value in table.items() if indexed.get(key) != value)
+
+    per_cell = len(states) * len(years) * len(corpus_builder.METRICS)
+    print(f"{len(states)} states x {len(years)} years x {len(corpus_builder.METRICS)} metrics = {summary['cells']} cells")
+    print(f"Round trips: {round_trips} (one query per cell would be {per_cell})")
+    print(f"Wall time: {elapsed:.2f} s at {args.ee_latency:.2f} s per round trip")
+    print(f"Cells missing or different after corpus_index parsing: {mismatches}")
+    print(f"Cells lost by a partial rebuild (failed years {partial['failed_years']}): {lost}")
+    return 1 if mismatches or lost or summary["failed_years"] or summary["cells"] != per_cell else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
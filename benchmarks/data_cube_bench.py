@@ -0,0 +1,105 @@
+# benchmarks/data_cube_bench.py
+"""
+Micro-benchmark for the chart data preparation in generate_visualization:
+the previous nested {state: {year: [values]}} dicts against data_cube.DataCube,
+for every state over ten years with all land-cover classes. Plotly figure
+construction is not included; both paths feed it the same series.
+
+Usage: python benchmarks/data_cube_bench.py [--repeat 50] [--seed 7]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import state_corpus_files, DYNAMIC_WORLD_CLASSES
+from data_cube import DataCube
+
+YEARS = [str(y) for y in range(2015, 2025)]
+
+
+def synthetic_records(states, metrics, seed):
+    rng = random.Random(seed)
+    return {(state, year, metric): round(rng.random(), 3)
+            for state in states for year in YEARS for metric in metrics if rng.random() > 0.05}
+
+
+def legacy_prepare(records, states, year_dict, metrics):
+    """The nested-dict bookkeeping generate_visualization used before the cube."""
+    data_by_state_year = {}
+    for state in states:
+        years = sorted(set(str(y) for y in year_dict.get(state, ["2024"]) if 2015 <= int(y) <= 2024))
+        data_by_state_year[state] = {year: [0.0] * len(metrics) for year in years}
+    for (state, year, metric), value in records.items():
+        if year in data_by_state_year[state]:
+            data_by_state_year[state][year][metrics.index(metric)] = value
+    missing = {state: [y for y in data_by_state_year[state] if not any(data_by_state_year[state][y])] for state in states}
+    for state in data_by_state_year:
+        for year in data_by_state_year[state]:
+            values = data_by_state_year[state][year]
+            total = sum(values)
+            if total > 0 and abs(total - 1.0) > 0.01:
+                data_by_state_year[state][year] = [v / total for v in values]
+    series = {}
+    for metric in metrics:
+        for state in states:
+            state_years = [str(y) for y in year_dict.get(state, ["2024"]) if 2015 <= int(y) <= 2024]
+            series[(state, metric)] = [data_by_state_year[state].get(y, [0.0] * len(metrics))[metrics.index(metric)]
+                                       for y in state_years]
+    return data_by_state_year, missing, series
+
+
+def cube_prepare(records, states, year_dict, metrics):
+    cube = DataCube.from_records(records, states, year_dict, metrics)
+    missing = cube.missing()
+    cube.normalize()
+    series = {(state, metric): cube.series(state, metric)[1]
+              for metric in metrics for state, plotted in zip(states, cube.has_data(metric)) if plotted}
+    return cube, missing, series
+
+
+def timed(label, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {elapsed / repeat * 1000:9.2f} ms/run")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    states = list(state_corpus_files)
+    metrics = list(DYNAMIC_WORLD_CLASSES)
+    year_dict = {state: list(YEARS) for state in states}
+    records = synthetic_records(states, metrics, args.seed)
+
+    legacy_data, _, _ = legacy_prepare(records, states, year_dict, metrics)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cube, _, _ = cube_prepare(records, states, year_dict, metrics)
+    mismatches = sum(
+        1 for state in states for year in YEARS
+        if any(abs(a - b) > 1e-9 for a, b in zip(legacy_data[state][year], cube.row(state, year)))
+    )
+
+    print(f"{len(states)} states x {len(YEARS)} years x {len(metrics)} metrics, {len(records)} records")
+    legacy_time = timed("nested dicts", lambda: legacy_prepare(records, states, year_dict, metrics), args.repeat)
+    # DataCube.normalize logs a summary line per call; keep it out of the timings table
+    with contextlib.redirect_stdout(io.StringIO()):
+        cube_time = timed("data cube", lambda: cube_prepare(records, states, year_dict, metrics), args.repeat)
+    print(f"{'data cube':<20} {cube_time / args.repeat * 1000:9.2f} ms/run")
+    print(f"Speedup: {legacy_time / cube_time:.1f}x, mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,539 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for the external services, for benchmarks and offline runs:
+a fake Mistral chat-completions HTTP server, a fake google.generativeai module,
+and fakes of the ee / geemap.foliumap subset used by map_generator.py. Every
+fake counts its round trips and supports injected latency and failures.
+
+Call install() before importing any project module, then point the project at
+a fixture workspace with use_workspace().
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CallCounter:
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class Faults:
+    """Latency (seconds, with +/- jitter fraction) and failure-rate injection shared by a fake."""
+
+    def __init__(self, latency=0.0, jitter=0.2, failure_rate=0.0, seed=7):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, latency=None):
+        latency = self.latency if latency is None else latency
+        if latency <= 0:
+            return
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(latency * factor)
+
+    def should_fail(self):
+        if self.failure_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+
+calls = CallCounter()
+
+
+def fake_value(*parts):
+    """Deterministic value in [0, 1) for a (state, year, metric) cell."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return round(int(digest[:8], 16) / 0xFFFFFFFF, 3)
+
+
+# --- Mistral -------------------------------------------------------------------
+
+_QUERY_PATTERN = re.compile(r"\nQuery: (.*) for (.*)$", re.DOTALL)
+_METRICS_PATTERN = re.compile(r"Metrics requested: (.*)$")
+_YEAR_PATTERN = re.compile(r"\b(20(?:1[5-9]|2[0-4]))\b")
+
+
+def _mistral_answer(payload):
+    system = payload["messages"][0]["content"]
+    user = payload["messages"][1]["content"]
+    match = _QUERY_PATTERN.search(user)
+    query, states = (match.group(1), [s.strip() for s in match.group(2).split(",")]) if match else ("", [])
+    metrics_match = _METRICS_PATTERN.search(system)
+    metrics = [m.strip() for m in metrics_match.group(1).split(",")] if metrics_match else ["NDVI"]
+    years = sorted(set(_YEAR_PATTERN.findall(query))) or ["2024"]
+    if payload.get("response_format", {}).get("type") == "json_object":
+        return json.dumps({"records": [
+            {"state": state, "year": year, "metric": metric, "value": fake_value(state, year, metric)}
+            for state in states for year in years for metric in metrics
+        ]})
+    lines = []
+    for state in states:
+        for year in years:
+            lines.append(f"{year} {state}")
+            lines.extend(f"- {metric}: {fake_value(state, year, metric)}" for metric in metrics)
+    lines.append("Data sourced from Sentinel-2 and Dynamic World.")
+    return "\n".join(lines)
+
+
+class FakeMistralServer:
+    """Threaded local HTTP server answering POST /v1/chat/completions from the request itself."""
+
+    def __init__(self, faults=None, counter=calls):
+        self.faults = faults or Faults()
+        self.counter = counter
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.counter.add("mistral.http")
+                server.faults.delay()
+                if server.faults.should_fail():
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                content = _mistral_answer(json.loads(body))
+                data = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1/chat/completions"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# --- google.generativeai -------------------------------------------------------
+
+def make_genai(faults=None, counter=calls, chunk_latency=0.0, paragraphs=4):
+    genai = types.ModuleType("google.generativeai")
+    faults = faults or Faults()
+
+    class _Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class GenerativeModel:
+        def __init__(self, model_name, **kwargs):
+            self.model_name = model_name
+
+        def _text(self, prompt):
+            values = re.findall(r"\b([A-Za-z_]+)\"?:\s*\"?(-?\d+(?:\.\d+)?)", prompt.split("Mistral Values:", 1)[-1])
+            lines = ["## Environmental Report", ""]
+            for metric, value in values[:paragraphs * 3]:
+                lines.append(f"{metric}: {value}. This value reflects the state's environmental condition for the period.")
+            lines.append("Data sourced from Sentinel-2 and Dynamic World.")
+            return "\n".join(lines)
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            counter.add("gemini.generate")
+            faults.delay()
+            if faults.should_fail():
+                raise RuntimeError("Injected Gemini failure")
+            text = self._text(prompt)
+            if not stream:
+                return _Chunk(text)
+
+            def chunks():
+                for line in text.splitlines(True):
+                    if chunk_latency:
+                        faults.delay(chunk_latency)
+                    yield _Chunk(line)
+            return chunks()
+
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = GenerativeModel
+    return genai
+
+
+# --- ee and geemap.foliumap ----------------------------------------------------
+
+def make_ee(faults=None, counter=calls, collection_size=3, empty_rate=0.0, seed=7):
+    """
+    Fake of the ee subset used by the project. Server-side objects are lazy; only
+    getInfo() and getMapId() are round trips (counted, delayed, failure-injected).
+    `empty_rate` is the fraction of collections reported empty (missing imagery).
+    """
+    ee = types.ModuleType("ee")
+    faults = faults or Faults()
+
+    def _evaluate(value):
+        if isinstance(value, ComputedObject):
+            return _evaluate(value._value)
+        if isinstance(value, dict):
+            return {k: _evaluate(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_evaluate(v) for v in value]
+        return value
+
+    def _round_trip(name):
+        counter.add(name)
+        faults.delay()
+        if faults.should_fail():
+            raise Exception(f"Injected Earth Engine failure in {name}")
+
+    class ComputedObject:
+        def __init__(self, value=None, *args, **kwargs):
+            self._value = value
+
+        def __getattr__(self, name):
+            if name.startswith("_"):
+                raise AttributeError(name)
+            return lambda *args, **kwargs: type(self)()
+
+        def gt(self, other):
+            return ComputedObject(_evaluate(self) > other)
+
+        def getInfo(self):
+            _round_trip("ee.getInfo")
+            return _evaluate(self)
+
+    class Image(ComputedObject):
+        """Tracks band names and the source collection key, so reduceRegions can answer per band and year."""
+
+        def __init__(self, value=None, *args, bands=None, key="", **kwargs):
+            super().__init__(value)
+            self._bands = list(bands or [])
+            self._key = key
+
+        def __getattr__(self, name):
+            if name.startswith("_"):
+                raise AttributeError(name)
+            return lambda *args, **kwargs: Image(bands=self._bands, key=self._key)
+
+        @staticmethod
+        def cat(images):
+            return Image(bands=[b for image in images for b in image._bands],
+                         key="|".join(image._key for image in images))
+
+        def rename(self, *names):
+            names = names[0] if len(names) == 1 and isinstance(names[0], list) else list(names)
+            return Image(bands=names, key=self._key)
+
+        def addBands(self, other):
+            return Image(bands=self._bands + other._bands, key=f"{self._key}|{other._key}")
+
+        def reduceRegions(self, collection, reducer=None, scale=None, tileScale=1, **kwargs):
+            year = re.search(r"date\|(\d{4})-", self._key)
+            year = year.group(1) if year else None
+            return FeatureCollection([
+                Feature(None, dict(f._properties, **{band: fake_value(f._properties.get("state"), year, band)
+                                                     for band in self._bands}))
+                for f in collection._flat()
+            ])
+
+        def getMapId(self, vis=None):
+            _round_trip("ee.getMapId")
+            tile_fetcher = types.SimpleNamespace(url_format=f"https://earthengine.invalid/{id(self)}/{{z}}/{{x}}/{{y}}")
+            return {"tile_fetcher": tile_fetcher}
+
+    class ImageCollection(ComputedObject):
+        def __init__(self, collection_id=None, *args, **kwargs):
+            super().__init__()
+            self._id = collection_id
+            self._key = [collection_id]
+
+        def _chain(self, *parts):
+            chained = ImageCollection(self._id)
+            chained._key = self._key + [str(p) for p in parts]
+            return chained
+
+        def filterBounds(self, geom):
+            return self._chain("bounds", getattr(geom, "_key", ""))
+
+        def filterDate(self, start, end):
+            return self._chain("date", start, end)
+
+        def filter(self, flt):
+            return self._chain("filter")
+
+        def sort(self, *args):
+            return self._chain("sort")
+
+        def __getattr__(self, name):
+            if name.startswith("_"):
+                raise AttributeError(name)
+            return lambda *args, **kwargs: self._chain(name)
+
+        def size(self):
+            empty = random.Random("|".join(self._key) + str(seed)).random() < empty_rate
+            return ComputedObject(0 if empty else collection_size)
+
+        def aggregate_max(self, prop):
+            return ComputedObject(1700000000000)
+
+        def mosaic(self):
+            return Image(key="|".join(self._key))
+
+        def median(self):
+            return Image(key="|".join(self._key))
+
+        def mode(self):
+            return Image(key="|".join(self._key))
+
+        def first(self):
+            return Image(key="|".join(self._key))
+
+    class Feature(ComputedObject):
+        def __init__(self, geometry=None, properties=None, *args, **kwargs):
+            super().__init__()
+            self._properties = dict(_evaluate(properties) or {})
+
+        def set(self, *args):
+            properties = dict(self._properties)
+            properties.update(args[0] if len(args) == 1 else {args[0]: _evaluate(args[1])})
+            return Feature(None, properties)
+
+        def toDictionary(self, *args):
+            return ComputedObject(dict(self._properties))
+
+    class FeatureCollection(ComputedObject):
+        def __init__(self, features=None, *args, **kwargs):
+            super().__init__()
+            self._features = list(features) if isinstance(features, (list, tuple)) else []
+
+        def _flat(self):
+            flat = []
+            for item in self._features:
+                flat.extend(item._flat() if isinstance(item, FeatureCollection) else [item])
+            return flat
+
+        def style(self, **kwargs):
+            return Image()
+
+        def map(self, func):
+            return FeatureCollection([func(f) for f in self._flat()])
+
+        def flatten(self):
+            return FeatureCollection(self._flat())
+
+        def getInfo(self):
+            _round_trip("ee.getInfo")
+            return {"type": "FeatureCollection",
+                    "features": [{"type": "Feature", "geometry": None, "properties": dict(f._properties)}
+                                 for f in self._flat()]}
+
+    class Geometry(ComputedObject):
+        def __init__(self, geojson=None, *args, **kwargs):
+            super().__init__()
+            self._key = hashlib.sha1(json.dumps(geojson, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+    class Algorithms:
+        @staticmethod
+        def If(condition, true_case, false_case):
+            return ComputedObject(_evaluate(true_case) if _evaluate(condition) else _evaluate(false_case))
+
+    ee.ComputedObject = ComputedObject
+    ee.Image = Image
+    ee.ImageCollection = ImageCollection
+    ee.FeatureCollection = FeatureCollection
+    ee.Feature = Feature
+    ee.Geometry = Geometry
+    ee.Dictionary = ComputedObject
+    ee.Filter = types.SimpleNamespace(lt=lambda *args: ComputedObject(), eq=lambda *args: ComputedObject())
+    ee.Algorithms = Algorithms
+    ee.Reducer = types.SimpleNamespace(mean=lambda: ComputedObject())
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.Authenticate = lambda *args, **kwargs: None
+    return ee
+
+
+def make_geemap():
+    foliumap = types.ModuleType("geemap.foliumap")
+
+    class Map:
+        def __init__(self, **kwargs):
+            self.layers = []
+            self.legends = []
+            self.center = None
+
+        def add_tile_layer(self, url, name=None, attribution=None, **kwargs):
+            self.layers.append((name, url))
+
+        def add_legend(self, **kwargs):
+            self.legends.append(kwargs.get("title"))
+
+        def set_center(self, lon, lat, zoom=None):
+            self.center = (lon, lat, zoom)
+
+        def centerObject(self, obj, zoom=None):
+            self.center = ("object", zoom)
+
+        def to_html(self, filename=None, **kwargs):
+            html = "<html><body>" + "".join(f"<div data-layer='{name}' data-url='{url}'></div>"
+                                            for name, url in self.layers) + "</body></html>"
+            if filename:
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write(html)
+            return html
+
+    foliumap.Map = Map
+    geemap = types.ModuleType("geemap")
+    geemap.foliumap = foliumap
+    return geemap, foliumap
+
+
+def install(mistral_faults=None, gemini_faults=None, ee_faults=None, counter=calls, **ee_options):
+    """Registers the fake genai, ee and geemap modules in sys.modules; returns them."""
+    genai = make_genai(gemini_faults, counter)
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+    ee = make_ee(ee_faults, counter, **ee_options)
+    sys.modules["ee"] = ee
+    geemap, foliumap = make_geemap()
+    sys.modules["geemap"] = geemap
+    sys.modules["geemap.foliumap"] = foliumap
+    return genai, ee, foliumap
+
+
+# --- Fixture workspace ---------------------------------------------------------
+
+def write_corpus(folder, state_corpus_files, years, metrics):
+    """Writes corpus files in the layout corpus_index parses ('2023 Kerala' headings, 'Sentinel2 NDVI at 0.41')."""
+    os.makedirs(folder, exist_ok=True)
+    for state, filename in state_corpus_files.items():
+        lines = []
+        for year in years:
+            lines.append(f"{year} {state}")
+            for metric in metrics:
+                prefix = "Sentinel2" if metric.isupper() else "DynamicWorld"
+                lines.append(f"{prefix} {metric} at {fake_value(state, year, metric)}")
+            lines.append("")
+        with open(os.path.join(folder, filename), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+def write_shapefile(path, states):
+    """Writes a GADM-like shapefile (NAME_1 + one box per state)."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    geometries = [box(*state_box(i)) for i in range(len(states))]
+    gpd.GeoDataFrame({"NAME_1": list(states)}, geometry=geometries, crs="EPSG:4326").to_file(path)
+
+
+def state_box(i):
+    """(min_lon, min_lat, max_lon, max_lat) of the i-th state in write_shapefile."""
+    return (70 + (i % 7) * 3, 8 + (i // 7) * 5, 72 + (i % 7) * 3, 12 + (i // 7) * 5)
+
+
+def write_district_shapefile(path, states):
+    """Writes a GADM level-2-like shapefile (NAME_1, NAME_2): each state box split into four districts 'Zone<i>A'..'D'."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rows = []
+    for i, state in enumerate(states):
+        min_lon, min_lat, max_lon, max_lat = state_box(i)
+        mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+        quadrants = [(min_lon, min_lat, mid_lon, mid_lat), (mid_lon, min_lat, max_lon, mid_lat),
+                     (min_lon, mid_lat, mid_lon, max_lat), (mid_lon, mid_lat, max_lon, max_lat)]
+        rows.extend((state, f"Zone{i}{letter}", box(*bounds)) for letter, bounds in zip("ABCD", quadrants))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gpd.GeoDataFrame({"NAME_1": [r[0] for r in rows], "NAME_2": [r[1] for r in rows]},
+                     geometry=[r[2] for r in rows], crs="EPSG:4326").to_file(path)
+
+
+def write_rasters(folder, years, bounds=(69.0, 7.0, 92.0, 33.0), resolution=0.02, seed=0):
+    """
+    Writes RASTER_FOLDER/<year>/sentinel2.tif (six uint16 reflectance bands) and
+    dynamicworld.tif (uint8 labels) as tiled GeoTIFFs over `bounds` in EPSG:4326.
+    """
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    west, south, east, north = bounds
+    width, height = int(round((east - west) / resolution)), int(round((north - south) / resolution))
+    profile = {"driver": "GTiff", "width": width, "height": height, "crs": "EPSG:4326",
+               "transform": from_origin(west, north, resolution, resolution), "tiled": True,
+               "blockxsize": 256, "blockysize": 256}
+    rng = np.random.default_rng(seed)
+    for year in years:
+        os.makedirs(os.path.join(folder, str(year)), exist_ok=True)
+        # Vegetation-like reflectance per band (B2, B3, B4, B8, B11, B12) keeps EVI's denominator away from zero
+        low = np.array([100, 300, 200, 1500, 800, 400], dtype=np.uint16)[:, None, None]
+        high = np.array([400, 1200, 1500, 6000, 3000, 2000], dtype=np.uint16)[:, None, None]
+        reflectance = rng.integers(low, high, size=(6, height, width), dtype=np.uint16)
+        with rasterio.open(os.path.join(folder, str(year), "sentinel2.tif"), "w", count=6, dtype="uint16",
+                           nodata=0, **profile) as dst:
+            dst.write(reflectance)
+        labels = rng.integers(0, 9, size=(1, height, width), dtype=np.uint8)
+        with rasterio.open(os.path.join(folder, str(year), "dynamicworld.tif"), "w", count=1, dtype="uint8",
+                           nodata=255, **profile) as dst:
+            dst.write(labels)
+
+
+def use_workspace(root, mistral_url, corpus_years, corpus_metrics):
+    """
+    Points config at a fixture workspace under `root` (corpus, shapefile, caches)
+    and the Mistral URL at the fake server. Must run before other project imports.
+    """
+    import config
+
+    config.CORPUS_FOLDER = os.path.join(root, "CORPUS")
+    config.SHAPEFILE_PATH = os.path.join(root, "SHAPE", "states.shp")
+    config.SHAPEFILE_L2_PATH = os.path.join(root, "SHAPE", "districts.shp")
+    config.CACHE_FOLDER = os.path.join(root, "CACHE")
+    config.CORPUS_INDEX_PATH = os.path.join(config.CACHE_FOLDER, "corpus_index.json")
+    config.TILE_CACHE_PATH = os.path.join(config.CACHE_FOLDER, "tile_cache.sqlite")
+    config.RESPONSE_CACHE_PATH = os.path.join(config.CACHE_FOLDER, "response_cache.sqlite")
+    config.CHAT_STORE_PATH = os.path.join(config.CACHE_FOLDER, "chats.sqlite")
+    config.SPATIAL_INDEX_PATH = os.path.join(config.CACHE_FOLDER, "spatial_index.json")
+    config.RASTER_FOLDER = os.path.join(root, "RASTER")
+    config.ZONAL_STATS_CACHE_PATH = os.path.join(config.CACHE_FOLDER, "zonal_stats.sqlite")
+    config.MISTRAL_API_URL = mistral_url
+    config.MISTRAL_API_KEY = "fake-key"
+    config.GEMINI_API_KEY = "fake-key"
+    write_corpus(config.CORPUS_FOLDER, config.state_corpus_files, corpus_years, corpus_metrics)
+    write_shapefile(config.SHAPEFILE_PATH, list(config.state_corpus_files))
+    return config
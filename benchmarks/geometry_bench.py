@@ -0,0 +1,99 @@
+# benchmarks/geometry_bench.py
+"""
+Payload benchmark for the geometry levels in geometry_store.py. Writes a
+shapefile of synthetic states with jagged, high-vertex coastlines (one state
+split across a mainland row and island rows) and reports, per level, the
+vertex count, GeoJSON request payload size and serialization time that every
+EE request carrying the geometry pays.
+
+Usage: python benchmarks/geometry_bench.py [--vertices 200000] [--states 4] [--repeat 20]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+
+def jagged_polygon(center, radius, vertices, rng):
+    """A roughly circular polygon (degrees) whose boundary wiggles at every vertex, like a detailed coastline."""
+    from shapely.geometry import Polygon
+
+    points = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * (1 + 0.05 * math.sin(angle * 40) + 0.002 * rng.uniform(-1, 1))
+        points.append((center[0] + r * math.cos(angle), center[1] + r * math.sin(angle)))
+    return Polygon(points)
+
+
+def write_states(path, states, vertices, seed=0):
+    import geopandas as gpd
+
+    rng = random.Random(seed)
+    names, geometries = [], []
+    for i, state in enumerate(states):
+        center = (72 + 5 * i, 20)
+        names.append(state)
+        geometries.append(jagged_polygon(center, 2.0, vertices, rng))
+        if i == 0:
+            # Island rows under the same name, which must end up in the state's union
+            for j in range(3):
+                names.append(state)
+                geometries.append(jagged_polygon((center[0] + 2.6, center[1] - 1.5 + j), 0.2, vertices // 50, rng))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gpd.GeoDataFrame({"NAME_1": names}, geometry=geometries, crs="EPSG:4326").to_file(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=200000)
+    parser.add_argument("--states", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fakes.install()
+    with tempfile.TemporaryDirectory() as root:
+        config = fakes.use_workspace(root, "http://127.0.0.1:9", [], [])
+        states = list(config.state_corpus_files)[:args.states]
+        write_states(config.SHAPEFILE_PATH, states, args.vertices)
+        import shapely
+        from shapely.geometry import shape
+        import geometry_store
+
+        first_state_rows = 4
+        union = shape(geometry_store.get_state_geojson(states[0]))
+        union_parts = len(getattr(union, "geoms", [union]))
+        print(f"{len(states)} states, ~{args.vertices} vertices each; "
+              f"{states[0]} unions {union_parts} of {first_state_rows} rows")
+        print(f"{'level':<10}{'vertices':>12}{'payload KB':>12}{'dumps ms':>10}{'simplify ms':>13}")
+        full_bytes = None
+        for level in geometry_store.LEVELS:
+            start = time.perf_counter()
+            geojsons = [geometry_store.get_state_geojson(state, level) for state in states]
+            prepare = time.perf_counter() - start
+            vertices = sum(shapely.get_num_coordinates(shape(g)) for g in geojsons)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                payload = json.dumps(geojsons)
+            dumps = (time.perf_counter() - start) / args.repeat
+            full_bytes = full_bytes or len(payload)
+            print(f"{level:<10}{vertices:12d}{len(payload) / 1024:12.1f}{dumps * 1000:10.2f}{prepare * 1000:13.1f}"
+                  f"  ({len(payload) / full_bytes:.1%} of full)")
+        mismatched = sum(1 for state in states
+                         if not shape(geometry_store.get_state_geojson(state, "bbox")).contains(
+                             shape(geometry_store.get_state_geojson(state, "clip"))))
+    print(f"States whose clip outline leaves the bbox: {mismatched}")
+    return 1 if mismatched or union_parts != first_state_rows else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
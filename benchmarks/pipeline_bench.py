@@ -0,0 +1,143 @@
+# benchmarks/pipeline_bench.py
+"""
+End-to-end pipeline benchmark against the local fakes in benchmarks/fakes.py.
+Drives representative queries through run_query_pipeline (one cold pass on
+empty caches, then warm passes), reports per-stage p50/p95 completion latency
+and external call counts, and fails when a pass makes more round trips than
+the recorded baseline.
+
+Usage: python benchmarks/pipeline_bench.py [--repeat 3] [--mistral-latency 0.05]
+       [--gemini-latency 0.05] [--ee-latency 0.02] [--failure-rate 0] [--update-baseline]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json")
+STAGES = ["extraction", "report", "visualizations", "maps"]
+QUERIES = [
+    "NDVI for Kerala 2023",
+    "Land cover for Kerala 2023",
+    "Compare NDVI and EVI in Kerala and Tamil Nadu in 2018",
+    "How has NDVI changed in Punjab over the last 3 years?",
+    "Compare land cover changes in Kerala and Telangana in 2023",
+    "Land cover for Bihar from 2017 to 2019",
+]
+# The fixture corpus covers these cells, so other years fall back to Mistral
+CORPUS_YEARS = [str(y) for y in range(2020, 2025)]
+
+
+def run_pass(run_query_pipeline, parse_query):
+    """Runs every query once; returns ({stage: [seconds]}, errors)."""
+    timings = {stage: [] for stage in STAGES + ["total"]}
+    errors = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        for stage, result in run_query_pipeline(parse_query(query)):
+            if stage in STAGES:
+                timings[stage].append(time.perf_counter() - start)
+            elif stage == "error":
+                errors.append(f"{query}: {result[1]}")
+        timings["total"].append(time.perf_counter() - start)
+    return timings, errors
+
+
+def compare_to_baseline(counts, baseline):
+    regressions = []
+    for pass_name, pass_counts in counts.items():
+        for name, count in pass_counts.items():
+            allowed = baseline.get(pass_name, {}).get(name, 0)
+            if count > allowed:
+                regressions.append(f"{pass_name} {name}: {count} round trips (baseline {allowed})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Warm passes after the cold pass")
+    parser.add_argument("--mistral-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--ee-latency", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Injected failure rate for every fake")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own log output")
+    args = parser.parse_args()
+
+    mistral_faults = fakes.Faults(args.mistral_latency, failure_rate=args.failure_rate)
+    fakes.install(gemini_faults=fakes.Faults(args.gemini_latency, failure_rate=args.failure_rate),
+                  ee_faults=fakes.Faults(args.ee_latency, failure_rate=args.failure_rate))
+
+    with fakes.FakeMistralServer(mistral_faults) as server, tempfile.TemporaryDirectory() as root:
+        import config
+        fakes.use_workspace(root, server.url, CORPUS_YEARS,
+                            ["NDVI", "NBR", "EVI", "NDMI", "MNDWI"] + config.DYNAMIC_WORLD_CLASSES)
+        from instrumentation import percentile, registry
+        from pipeline import run_query_pipeline
+        from query_parser import parse_query
+
+        passes = []
+        counts = {}
+        all_errors = []
+        for i in range(args.repeat + 1):
+            pass_name = "cold" if i == 0 else "warm"
+            fakes.calls.reset()
+            log = io.StringIO()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+                timings, errors = run_pass(run_query_pipeline, parse_query)
+            passes.append((pass_name, timings))
+            all_errors.extend(errors)
+            snapshot = fakes.calls.snapshot()
+            # Warm passes should all look alike; keep the worst one
+            merged = counts.setdefault(pass_name, {})
+            for name, count in snapshot.items():
+                merged[name] = max(merged.get(name, 0), count)
+
+    print(f"{len(QUERIES)} queries, 1 cold + {args.repeat} warm passes")
+    print(f"{'stage':<16}{'pass':<6}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage in STAGES + ["total"]:
+        for pass_name in ("cold", "warm"):
+            samples = [s for name, timings in passes if name == pass_name for s in timings[stage]]
+            if samples:
+                print(f"{stage:<16}{pass_name:<6}{percentile(samples, 0.5) * 1000:10.1f}{percentile(samples, 0.95) * 1000:10.1f}")
+    print("Round trips per pass:")
+    for pass_name, pass_counts in counts.items():
+        print(f"  {pass_name}: " + ", ".join(f"{name}={count}" for name, count in sorted(pass_counts.items())))
+    print("Slowest spans (all passes, total ms / count):")
+    spans = registry.snapshot()["spans"]
+    for name, entry in sorted(spans.items(), key=lambda item: -item[1]["sum"])[:8]:
+        print(f"  {name:<24}{entry['sum'] * 1000:10.1f}{entry['count']:6d}")
+    for error in all_errors[:10]:
+        print(f"Stage error: {error}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(counts, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if args.failure_rate > 0:
+        print("Failure injection retries add round trips; skipping the baseline check")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        regressions = compare_to_baseline(counts, json.load(f))
+    for regression in regressions:
+        print(f"Round-trip regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
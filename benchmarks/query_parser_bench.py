@@ -0,0 +1,144 @@
+# benchmarks/query_parser_bench.py
+"""
+Micro-benchmark for query_parser.parse_query over a large synthetic query set.
+Compares against the previous per-state regex implementation of the extract_*
+functions and checks both produce identical results.
+
+Usage: python benchmarks/query_parser_bench.py [--queries 20000] [--seed 7]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+# query_parser reads the index names from spectral_indices, which imports ee
+fakes.install()
+
+from config import state_corpus_files, DYNAMIC_WORLD_CLASSES
+from query_parser import parse_query
+
+TEMPLATES = [
+    "{metric} for {state} {year}",
+    "Compare {metric} in {state} and {state2} from {year} to {year2}",
+    "How has {metric} changed in {state} over the last {n} years?",
+    "Show {metric} of {state} in {year}, {year2}",
+    "Land cover for {state} {year}",
+    "Compare land cover changes in {state} and {state2} in {year}",
+    "What is the {metric} and {metric2} trend for {state} between {year}-{year2}",
+    "Tell me about the environment of {state}",
+]
+METRIC_WORDS = ["NDVI", "NBR", "EVI", "NDMI", "MNDWI", "vegetation", "water index", "forest cover"]
+
+
+def legacy_extract_states(query):
+    return [state for state in state_corpus_files.keys() if re.search(rf"\b{state}\b", query, re.IGNORECASE)]
+
+
+def legacy_extract_year(query):
+    year_dict = {}
+    states = legacy_extract_states(query) or ["default"]
+    for state in states:
+        year_dict[state] = []
+    last_n_years_match = re.search(r"last\s+(\d+)\s+years?", query, re.IGNORECASE)
+    if last_n_years_match:
+        start_year = max(2015, 2024 - int(last_n_years_match.group(1)) + 1)
+        return {state: [str(y) for y in range(start_year, 2025)] for state in states}
+    range_match = re.search(r"(\d{4})\s*(?:to|-)\s*(\d{4})", query, re.IGNORECASE)
+    if range_match:
+        start_year, end_year = map(int, range_match.groups())
+        start_year, end_year = max(2015, start_year), min(2024, end_year)
+        if start_year <= end_year:
+            for state in states:
+                year_dict[state] = [str(y) for y in range(start_year, end_year + 1)]
+    multiple_years = re.findall(r"\b(\d{4})\b", query)
+    if multiple_years and not range_match:
+        valid_years = [y for y in multiple_years if 2015 <= int(y) <= 2024]
+        if valid_years:
+            for state in states:
+                year_dict[state] = sorted(set(valid_years))
+    for state in states:
+        match = re.search(rf"\b{re.escape(state)}\s*(\d{{4}})?\b", query, re.IGNORECASE)
+        if match and match.group(1) and not year_dict[state]:
+            year_dict[state] = [match.group(1)] if 2015 <= int(match.group(1)) <= 2024 else []
+    for state in states:
+        if not year_dict[state]:
+            year_dict[state] = ["2024"]
+    return year_dict
+
+
+def legacy_extract_metrics(query):
+    query_lower = query.lower()
+    if "land cover" in query_lower:
+        return DYNAMIC_WORLD_CLASSES
+    names = ["ndvi", "nbr", "evi", "ndmi", "mndwi"]
+    for name in names:
+        others = [m for m in names if m != name] + ["land cover"]
+        if name in query_lower and not any(m in query_lower for m in others):
+            return [name.upper()]
+    return ["NDVI"]
+
+
+def synthetic_queries(count, seed):
+    rng = random.Random(seed)
+    states = list(state_corpus_files)
+    queries = []
+    for _ in range(count):
+        year = rng.randint(2012, 2026)
+        queries.append(rng.choice(TEMPLATES).format(
+            metric=rng.choice(METRIC_WORDS), metric2=rng.choice(METRIC_WORDS),
+            state=rng.choice(states), state2=rng.choice(states).lower(),
+            year=year, year2=year + rng.randint(-2, 6), n=rng.randint(1, 12),
+        ))
+    return queries
+
+
+def timed(label, func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {elapsed / len(queries) * 1e6:8.2f} us/query")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = synthetic_queries(args.queries, args.seed)
+    mismatches = 0
+    for query in queries:
+        plan = parse_query.__wrapped__(query)
+        if (plan.state_list, plan.year_dict, plan.metric_list) != (
+                legacy_extract_states(query), legacy_extract_year(query), list(legacy_extract_metrics(query))):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch: {query!r}")
+
+    def legacy(query):
+        legacy_extract_states(query)
+        legacy_extract_year(query)
+        legacy_extract_metrics(query)
+
+    print(f"{len(queries)} synthetic queries, {len(set(queries))} distinct")
+    legacy_time = timed("legacy extract_*", legacy, queries)
+    parse_time = timed("parse_query (uncached)", parse_query.__wrapped__, queries)
+    # Chat traffic repeats queries; replay a hot set that fits in the memo cache
+    hot_queries = queries[:500] * (len(queries) // 500 or 1)
+    parse_query.cache_clear()
+    timed("parse_query (memoized, hot)", parse_query, hot_queries)
+    print(f"Uncached speedup: {legacy_time / parse_time:.1f}x, mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
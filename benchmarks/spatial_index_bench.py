@@ -0,0 +1,86 @@
+# benchmarks/spatial_index_bench.py
+"""
+Benchmark for spatial_index.py over the fixture state boxes and a level-2
+district shapefile: index build, reload from the persisted file, per-lookup
+latency for points, bounding boxes and district names, and a correctness
+check of queries resolved through parse_query.
+
+Usage: python benchmarks/spatial_index_bench.py [--lookups 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+
+def timed_us(func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    fakes.install()
+    with tempfile.TemporaryDirectory() as root:
+        config = fakes.use_workspace(root, "http://127.0.0.1:9", [], [])
+        states = list(config.state_corpus_files)
+        fakes.write_district_shapefile(config.SHAPEFILE_L2_PATH, states)
+        import spatial_index
+        from query_parser import parse_query
+
+        start = time.perf_counter()
+        index = spatial_index.get_spatial_index()
+        build = time.perf_counter() - start
+        spatial_index._index = None
+        start = time.perf_counter()
+        index = spatial_index.get_spatial_index()
+        reload = time.perf_counter() - start
+
+        kerala = states.index("Kerala")
+        min_lon, min_lat, max_lon, max_lat = fakes.state_box(kerala)
+        lon, lat = (min_lon + max_lon) / 2 + 0.3, (min_lat + max_lat) / 2 + 0.3
+        print(f"{len(index.state_names)} states, {len(index.district_names)} districts")
+        print(f"build {build * 1000:.1f} ms, reload from {os.path.basename(config.SPATIAL_INDEX_PATH)} {reload * 1000:.1f} ms")
+        print(f"point lookup     {timed_us(lambda: index.states_at(lon, lat), args.lookups):8.1f} us")
+        print(f"bbox lookup      {timed_us(lambda: index.states_in_bbox(min_lon, min_lat, max_lon + 2, max_lat), args.lookups):8.1f} us")
+        print(f"district lookup  {timed_us(lambda: index.district_states_for(f'Zone{kerala}D'), args.lookups):8.1f} us")
+
+        neighbour = states[kerala + 1]
+        cases = [
+            (f"NDVI at {lat:.3f}, {lon:.3f} in 2023", ["Kerala"], ["2023"], 1),
+            (f"NDVI at {lat:.3f}N {lon:.3f}E", ["Kerala"], ["2024"], 1),
+            (f"NDVI {lat:.3f}°, {lon:.3f}° in 2023", ["Kerala"], ["2023"], 1),
+            # The next word's initial is not a hemisphere letter
+            (f"NDVI at {lat:.3f}, {lon:.3f} with clouds in 2023", ["Kerala"], ["2023"], 1),
+            (f"NDVI at {lat:.3f}, {lon:.3f} every year", ["Kerala"], ["2024"], 1),
+            (f"NDVI at {lat:.3f}, {lon:.3f} west side", ["Kerala"], ["2024"], 1),
+            # A bare decimal pair is a value, not a coordinate
+            ("NDVI above 0.4, 0.6 for Kerala", ["Kerala"], ["2024"], 0),
+            (f"Land cover in bbox {min_lon + 1.5}, {min_lat + 1}, {max_lon + 1.5}, {max_lat - 1} for 2020",
+             sorted(["Kerala", neighbour], key=states.index), ["2020"], 1),
+            (f"NDVI for Zone{kerala}D from 2019 to 2021", ["Kerala"], ["2019", "2020", "2021"], 1),
+            ("Compare NDVI in West Bengal and Kerala 2022", ["Kerala", "West Bengal"], ["2022"], 0),
+        ]
+        failures = 0
+        for query, expected_states, expected_years, expected_locations in cases:
+            plan = parse_query(query)
+            ok = (plan.state_list == expected_states and len(plan.locations) == expected_locations
+                  and all(years == expected_years for years in plan.year_dict.values()))
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {query!r} -> {plan.state_list} {plan.year_dict} {list(plan.locations)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
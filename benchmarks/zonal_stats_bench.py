@@ -0,0 +1,114 @@
+# benchmarks/zonal_stats_bench.py
+"""
+Benchmark for the offline zonal statistics in zonal_stats.py on synthetic
+rasters over the fixture state boxes: a cold run (tiled reads in-process and
+on N worker processes, whose first call includes starting the shared pool),
+a warm run from the cache, and a check against a whole-raster NumPy reference
+computed with rasterio.features.geometry_mask. --min-tiles-per-worker 0 forces
+the pool regardless of the tile count.
+
+Usage: python benchmarks/zonal_stats_bench.py [--workers 4] [--tile-size 512] [--states 6] [--resolution 0.02]
+                                              [--min-tiles-per-worker N]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+YEAR = "2023"
+
+
+def reference_stats(path, kind, states, get_state_geojson, classes, indices, bands, evaluate_index):
+    """Whole-raster, per-state masks: the straightforward computation zonal_stats tiles and parallelizes."""
+    import numpy as np
+    import rasterio
+    from rasterio.features import geometry_mask
+
+    results = {}
+    with rasterio.open(path) as src:
+        data = src.read(masked=True)
+        for state in states:
+            inside = ~geometry_mask([get_state_geojson(state)], out_shape=(src.height, src.width),
+                                    transform=src.transform)
+            if kind == "spectral":
+                arrays = {alias: data[i].astype("float64").filled(np.nan) / 10000.0 for i, alias in enumerate(bands)}
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    results[state] = {}
+                    for metric in indices:
+                        index = evaluate_index(metric, arrays)
+                        results[state][metric] = round(float(np.nanmean(index[inside])), 4)
+            else:
+                labels = data[0].data[inside & ~np.ma.getmaskarray(data[0])]
+                counts = np.bincount(labels, minlength=len(classes))[:len(classes)]
+                results[state] = {cls: round(float(c / counts.sum()), 4) for cls, c in zip(classes, counts)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--states", type=int, default=6)
+    parser.add_argument("--resolution", type=float, default=0.02, help="Raster pixel size in degrees")
+    parser.add_argument("--min-tiles-per-worker", type=int, default=None)
+    args = parser.parse_args()
+
+    fakes.install()
+    with tempfile.TemporaryDirectory() as root:
+        config = fakes.use_workspace(root, "http://127.0.0.1:9", [], [])
+        fakes.write_rasters(config.RASTER_FOLDER, [YEAR], resolution=args.resolution)
+        config.ZONAL_STATS_TILE_SIZE = args.tile_size
+        import zonal_stats
+        if args.min_tiles_per_worker is not None:
+            zonal_stats.MIN_TILES_PER_WORKER = args.min_tiles_per_worker
+        # The shared pool as zonal_stats starts it, plus the fakes, which spawned workers do not inherit
+        zonal_stats._pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=fakes.install)
+        pool_used = False
+        from geometry_store import get_state_geojson
+        from spectral_indices import SENTINEL2_BANDS, SPECTRAL_INDICES, evaluate_index
+
+        states = list(config.state_corpus_files)[:args.states]
+        mismatches = 0
+        print(f"{len(states)} states, {args.resolution} degree pixels, tile size {args.tile_size}")
+        for kind, raster in (("spectral", zonal_stats.SENTINEL2_RASTER), ("land_cover", zonal_stats.DYNAMIC_WORLD_RASTER)):
+            path = zonal_stats.raster_path(YEAR, raster)
+            start = time.perf_counter()
+            expected = reference_stats(path, kind, states, get_state_geojson, config.DYNAMIC_WORLD_CLASSES,
+                                       SPECTRAL_INDICES, SENTINEL2_BANDS, evaluate_index)
+            reference_time = time.perf_counter() - start
+            print(f"{kind:<11} {'reference':<18}{reference_time * 1000:10.1f} ms")
+            runs = [(1, "tiled, 1 worker")]
+            if args.workers > 1:
+                if not pool_used:
+                    runs.append((args.workers, f"tiled, {args.workers} first"))
+                runs.append((args.workers, f"tiled, {args.workers} workers"))
+            for workers, label in runs:
+                zonal_stats.ZONAL_STATS_WORKERS = workers
+                start = time.perf_counter()
+                computed = zonal_stats._compute(path, kind, states)
+                pool_used = pool_used or bool(zonal_stats._pool._processes)
+                print(f"{kind:<11} {label:<18}{(time.perf_counter() - start) * 1000:10.1f} ms")
+                mismatches += sum(1 for state in states for metric, value in expected[state].items()
+                                  if abs(computed[state].get(metric, float("nan")) - value) > 1e-3)
+            zonal_stats.state_year_stats(states, YEAR, kind)
+            start = time.perf_counter()
+            zonal_stats.state_year_stats(states, YEAR, kind)
+            print(f"{kind:<11} {'cached':<18}{(time.perf_counter() - start) * 1000:10.1f} ms")
+        print(f"Process pool {'used' if pool_used else 'not used'} "
+              f"(at least {zonal_stats.MIN_TILES_PER_WORKER} tiles per worker)")
+        zonal_stats._pool.shutdown()
+        print(f"Mismatches against the reference: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# chat_render.py
+"""
+Serialized chat payloads. Figures are stored as Plotly JSON and maps as their
+layer recipes, never as rendered HTML: EE tile URLs expire, so a stored map is
+rebuilt through the tile cache when its message is opened. Rendered map HTML
+is memoized by its tile URLs so a Streamlit rerun does not re-render it.
+"""
+import streamlit as st
+import streamlit.components.v1 as components
+from plotly.offline import get_plotlyjs_version
+
+from config import MAP_HTML_CACHE_BYTES
+from disk_cache import cache_key
+from instrumentation import span
+from map_generator import build_map, map_spec
+from response_cache import LRUCache
+
+FIGURE_HEIGHT = 470
+MAP_HEIGHT = 400
+
+_FIGURE_HTML = (
+    '<script src="https://cdn.plot.ly/plotly-{version}.min.js"></script>'
+    '<div id="figure"></div>'
+    '<script>const figure = {figure}; '
+    'Plotly.newPlot("figure", figure.data, figure.layout, {{responsive: true}});</script>'
+)
+_map_html_cache = LRUCache(float("inf"), float("inf"), max_bytes=MAP_HTML_CACHE_BYTES)
+
+
+def serialize_figures(figures):
+    with span("chart.serialize", figures=len(figures)):
+        return [fig.to_json() for fig in figures]
+
+
+def serialize_map(map_obj):
+    return map_spec(map_obj)
+
+
+def serialize_comparative_maps(comparative_maps):
+    return [
+        {"state": m["state"], "year": m["year"], "error": m.get("error"),
+         "spec": serialize_map(m["map"]) if m.get("map") is not None else None}
+        for m in comparative_maps
+    ]
+
+
+def _figure_html(figure):
+    # Chats saved before figures were stored as JSON hold the rendered HTML
+    if figure.lstrip().startswith("<"):
+        return figure
+    return _FIGURE_HTML.format(version=get_plotlyjs_version(), figure=figure.replace("</", "<\\/"))
+
+
+def _map_html(spec):
+    # Chats saved before maps were stored as layer specs hold the rendered HTML
+    if isinstance(spec, str):
+        return spec
+    m, urls = build_map(spec)
+    key = cache_key({"spec": spec, "urls": urls})
+    html = _map_html_cache.get(key)
+    if html is None:
+        with span("map.render"):
+            html = m.to_html()
+        _map_html_cache.set(key, html, len(html))
+    return html
+
+
+def render_visualizations(figures):
+    st.markdown("### Visualizations")
+    for i in range(0, len(figures), 2):
+        graphs_to_show = figures[i:i+2]
+        cols = st.columns(len(graphs_to_show))
+        for idx, figure in enumerate(graphs_to_show):
+            with cols[idx]:
+                components.html(_figure_html(figure), height=FIGURE_HEIGHT)
+
+
+def render_map(spec, captions):
+    st.markdown("### GEE Map")
+    components.html(_map_html(spec), height=MAP_HEIGHT)
+    if captions:
+        for caption in set(captions):
+            st.caption(caption)
+
+
+def render_comparative_maps(comparative_maps):
+    st.markdown("### Comparative GEE Maps Across Years")
+    maps_by_state = {}
+    for m in comparative_maps:
+        maps_by_state.setdefault(m["state"], []).append(m)
+    for state, state_maps in maps_by_state.items():
+        if len(state_maps) > 1:
+            st.markdown(f"#### {state}")
+            tabs = st.tabs([f"{m['year']}" for m in state_maps])
+            for tab, map_data in zip(tabs, state_maps):
+                with tab:
+                    if map_data.get("error"):
+                        st.warning(map_data["error"])
+                        continue
+                    components.html(_map_html(map_data.get("spec") or map_data["html"]), height=MAP_HEIGHT)
+
+
+def render_report(report):
+    st.markdown("### Environmental Report")
+    st.markdown(f'<div class="bot-msg">{report}</div>', unsafe_allow_html=True)
+
+
+def render_outputs(msg):
+    if msg.get("visualizations"):
+        render_visualizations(msg["visualizations"])
+    if msg.get("map"):
+        render_map(msg["map"], msg.get("map_captions"))
+    if msg.get("comparative_maps"):
+        render_comparative_maps(msg["comparative_maps"])
+
+
+def render_assistant_message(msg, key, collapsed):
+    """
+    Renders a stored assistant message. Collapsed (older) messages show the report
+    in an expander and only draw their charts and maps when the user asks for them.
+    """
+    has_outputs = msg.get("visualizations") or msg.get("map") or msg.get("comparative_maps")
+    if collapsed:
+        if msg.get("report"):
+            with st.expander("Environmental Report"):
+                st.markdown(f'<div class="bot-msg">{msg["report"]}</div>', unsafe_allow_html=True)
+        if has_outputs and st.toggle("Show charts and maps", key=f"show_outputs_{key}"):
+            render_outputs(msg)
+    else:
+        if msg.get("report"):
+            render_report(msg["report"])
+        render_outputs(msg)
+    if "error" in msg:
+        st.error(msg["error"])
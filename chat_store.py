@@ -0,0 +1,119 @@
+# chat_store.py
+"""
+SQLite-backed chat history. Messages are stored as compressed JSON payloads
+(report text, figure JSON and map layer specs) and only a working set of chats
+bounded by their decoded size is kept in memory; any other chat is reloaded
+from disk when it is opened.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import closing
+
+from config import CHAT_STORE_PATH, CHAT_STORE_MEMORY_BYTES
+from response_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(message):
+    """Returns (compressed payload, decoded size in bytes)."""
+    raw = json.dumps(message).encode("utf-8")
+    return zlib.compress(raw), len(raw)
+
+
+def _decode(payload):
+    """Returns (message, decoded size in bytes)."""
+    raw = zlib.decompress(payload)
+    return json.loads(raw.decode("utf-8")), len(raw)
+
+
+class ChatStore:
+    def __init__(self, path, memory_bytes):
+        self.path = path
+        # Values are (messages, decoded size) so appends can keep the byte count current
+        self.memory = LRUCache(float("inf"), float("inf"), max_bytes=memory_bytes)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chats ("
+                "chat_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, name TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chats_session ON chats (session_id, created)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "chat_id TEXT NOT NULL, position INTEGER NOT NULL, payload BLOB NOT NULL, "
+                "PRIMARY KEY (chat_id, position))"
+            )
+            self._initialized = True
+        return conn
+
+    def create_chat(self, session_id, name):
+        chat_id = uuid.uuid4().hex
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO chats (chat_id, session_id, name, created) VALUES (?, ?, ?, ?)",
+                         (chat_id, session_id, name, time.time()))
+        self.memory.set(chat_id, ([], 0))
+        return chat_id
+
+    def list_chats(self, session_id):
+        """Returns [(chat_id, name)] for a session, oldest first."""
+        try:
+            with self._lock, closing(self._connect()) as conn:
+                return conn.execute("SELECT chat_id, name FROM chats WHERE session_id = ? ORDER BY created",
+                                    (session_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Chat list failed for %s: %s", self.path, e)
+            return []
+
+    def _load(self, chat_id):
+        """Returns (messages, decoded size) from the working set or else from disk."""
+        cached = self.memory.get(chat_id)
+        if cached is not None:
+            return cached
+        try:
+            with self._lock, closing(self._connect()) as conn:
+                rows = conn.execute("SELECT payload FROM messages WHERE chat_id = ? ORDER BY position",
+                                    (chat_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Chat load failed for %s: %s", chat_id, e)
+            return [], 0
+        decoded = [_decode(payload) for payload, in rows]
+        messages = [message for message, _ in decoded]
+        size = sum(message_size for _, message_size in decoded)
+        self.memory.set(chat_id, (messages, size), size)
+        return messages, size
+
+    def get_messages(self, chat_id):
+        """Returns the messages of a chat, from the working set or else from disk."""
+        return self._load(chat_id)[0]
+
+    def append_message(self, chat_id, message):
+        messages, size = self._load(chat_id)
+        with self._lock:
+            try:
+                payload, message_size = _encode(message)
+                with closing(self._connect()) as conn, conn:
+                    conn.execute(
+                        "INSERT INTO messages (chat_id, position, payload) VALUES (?, "
+                        "(SELECT COALESCE(MAX(position), -1) + 1 FROM messages WHERE chat_id = ?), ?)",
+                        (chat_id, chat_id, payload),
+                    )
+            except (sqlite3.Error, TypeError) as e:
+                logger.error("Chat write failed for %s: %s", chat_id, e)
+                message_size = 0
+            messages.append(message)
+        self.memory.set(chat_id, (messages, size + message_size), size + message_size)
+
+
+chat_store = ChatStore(CHAT_STORE_PATH, CHAT_STORE_MEMORY_BYTES)
@@ -14,9 +14,59 @@ MISTRAL_API_URL = os.getenv("MISTRAL_API_URL")
 EE_PROJECT = os.getenv("EE_PROJECT") 
 
 
+# --- Logging and Metrics ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Port for the /metrics (Prometheus) and /metrics.json endpoint; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# --- Concurrency ---
+MAP_BUILD_WORKERS = int(os.getenv("MAP_BUILD_WORKERS", "4"))
+# Processes reading raster tiles for offline zonal statistics (1 reads them in-process)
+ZONAL_STATS_WORKERS = int(os.getenv("ZONAL_STATS_WORKERS", "1"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+MISTRAL_MAX_CONCURRENCY = int(os.getenv("MISTRAL_MAX_CONCURRENCY", "4"))
+
+# --- Prompt Construction ---
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Ask Mistral for JSON (state, year, metric, value) records instead of free text
+MISTRAL_STRUCTURED_OUTPUT = os.getenv("MISTRAL_STRUCTURED_OUTPUT", "1") == "1"
+
+# --- Chat History ---
+# Assistant responses drawn in full on every rerun; older ones collapse until opened
+HISTORY_EXPANDED_RESPONSES = int(os.getenv("HISTORY_EXPANDED_RESPONSES", "2"))
+
+# --- Data Coverage ---
+# Years (inclusive) that queries, the corpus, charts and maps accept; the latest is the default
+MIN_YEAR = 2015
+MAX_YEAR = 2024
+
 # --- File and Folder Paths ---
 CORPUS_FOLDER = "./CORPUS"
 SHAPEFILE_PATH = "./SHAPE/gadm41_IND_1.shp"
+# Optional GADM level-2 (district) boundaries, used to resolve district names and points to states
+SHAPEFILE_L2_PATH = "./SHAPE/gadm41_IND_2.shp"
+# Simplification tolerances (degrees) of the geometries sent to EE: ~100 m for clipping,
+# ~1 km (about a pixel at the maps' zoom 7) for boundary outlines
+GEOMETRY_CLIP_TOLERANCE = float(os.getenv("GEOMETRY_CLIP_TOLERANCE", "0.001"))
+GEOMETRY_DISPLAY_TOLERANCE = float(os.getenv("GEOMETRY_DISPLAY_TOLERANCE", "0.01"))
+CACHE_FOLDER = "./CACHE"
+# Yearly local rasters: RASTER/<year>/sentinel2.tif and RASTER/<year>/dynamicworld.tif
+RASTER_FOLDER = "./RASTER"
+ZONAL_STATS_TILE_SIZE = int(os.getenv("ZONAL_STATS_TILE_SIZE", "1024"))
+CORPUS_INDEX_PATH = os.path.join(CACHE_FOLDER, "corpus_index.json")
+TILE_CACHE_PATH = os.path.join(CACHE_FOLDER, "tile_cache.sqlite")
+TILE_CACHE_TTL = int(os.getenv("TILE_CACHE_TTL", str(6 * 3600)))
+RESPONSE_CACHE_PATH = os.path.join(CACHE_FOLDER, "response_cache.sqlite")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+ZONAL_STATS_CACHE_PATH = os.path.join(CACHE_FOLDER, "zonal_stats.sqlite")
+SPATIAL_INDEX_PATH = os.path.join(CACHE_FOLDER, "spatial_index.json")
+CHAT_STORE_PATH = os.path.join(CACHE_FOLDER, "chats.sqlite")
+# Decoded size of the chats kept in memory (process-wide); others are reloaded from CHAT_STORE_PATH
+CHAT_STORE_MEMORY_BYTES = int(os.getenv("CHAT_STORE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+# Rendered map HTML kept in memory so reruns do not re-render history maps whose tiles are unchanged
+MAP_HTML_CACHE_BYTES = int(os.getenv("MAP_HTML_CACHE_BYTES", str(16 * 1024 * 1024)))
 
 # --- State to Corpus File Mapping ---
 state_corpus_files = {
@@ -51,6 +101,10 @@ state_corpus_files = {
 }
 
 # --- Data Constants ---
+# Earth Engine collections read by the map generator and the corpus builder
+SENTINEL2 = "sentinel2"
+DYNAMIC_WORLD = "dynamic_world"
+COLLECTION_IDS = {SENTINEL2: "COPERNICUS/S2_HARMONIZED", DYNAMIC_WORLD: "GOOGLE/DYNAMICWORLD/V1"}
 DYNAMIC_WORLD_CLASSES = [
     "water", "trees", "grass", "flooded_vegetation", "crops",
     "shrub_and_scrub", "built", "bare", "snow_and_ice"
@@ -62,6 +116,7 @@ LAND_COVER_LEGEND = {
     "labels": ["Water", "Trees", "Grass", "Flooded Vegetation", "Crops", "Shrub and Scrub", "Built", "Bare", "Snow and Ice"],
     "colors": ["#419BDF", "#397D49", "#88B053", "#7A87C6", "#E49635", "#DFC35A", "#C4281B", "#A59B8F", "#B39FE1"]
 }
+LAND_COVER_VIS = {"min": 0, "max": 8, "palette": [color.lstrip("#") for color in LAND_COVER_LEGEND["colors"]]}
 LAND_COVER_CAPTION = (
     "Land Cover Color Mapping:\n- Blue (#419BDF): Water\n- Dark Green (#397D49): Trees\n- Light Green (#88B053): Grass\n- Purple (#7A87C6): Flooded Vegetation\n- Orange (#E49635): Crops\n- Yellow (#DFC35A): Shrub and Scrub\n- Red (#C4281B): Built\n- Gray (#A59B8F): Bare\n- Light Purple (#B39FE1): Snow and Ice"
 )
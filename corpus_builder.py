@@ -0,0 +1,224 @@
+# corpus_builder.py
+"""
+Regenerates the CORPUS files from Earth Engine. Every state goes to EE as one
+FeatureCollection; each year's Sentinel-2 median-composite indices and Dynamic
+World class fractions are reduced over all states with a single reduceRegions,
+and the years are fetched in a few batched getInfo calls. Writes one text
+corpus per state, in the layout corpus_index and prompt_builder parse, and
+refreshes corpus_index's compiled (state, year, metric) table from them.
+
+Usage: python corpus_builder.py [--years 2015-2024] [--states Kerala "Tamil Nadu"] [--scale 1000]
+       [--tile-scale 4] [--years-per-request 2] [--workers 4]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+from config import (COLLECTION_IDS, CORPUS_FOLDER, DYNAMIC_WORLD, DYNAMIC_WORLD_CLASSES, EE_PROJECT, MAX_YEAR, MIN_YEAR,
+                    SENTINEL2, state_corpus_files)
+from corpus_index import SPECTRAL_METRICS, get_corpus_index
+from geometry_store import get_state_geometry
+from instrumentation import configure_logging, span
+from spectral_indices import compute_indices
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_YEARS = [str(y) for y in range(MIN_YEAR, MAX_YEAR + 1)]
+METRICS = SPECTRAL_METRICS + DYNAMIC_WORLD_CLASSES
+
+
+def parse_years(spec):
+    """'2015-2024' or '2019,2021' -> ['2015', ..., '2024']."""
+    years = []
+    for part in spec.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            years.extend(str(y) for y in range(int(start), int(end) + 1))
+        elif part.strip():
+            years.append(part.strip())
+    return years
+
+
+def states_collection(states):
+    """One ee.FeatureCollection of the GADM state polygons, each tagged with its name."""
+    features = []
+    for state in states:
+        geometry = get_state_geometry(state)
+        if geometry is None:
+            logger.warning("No geometry for %s in the shapefile; skipping", state)
+            continue
+        features.append(ee.Feature(geometry, {"state": state}))
+    return ee.FeatureCollection(features)
+
+
+def annual_image(states_fc, year):
+    """
+    The year's spectral indices (from a Sentinel-2 median composite) and Dynamic World
+    classes (one 0/1 band per class of the modal label, so a regional mean is the class share).
+    """
+    start, end = f"{year}-01-01", f"{int(year) + 1}-01-01"
+    composite = (
+        ee.ImageCollection(COLLECTION_IDS[SENTINEL2])
+        .filterBounds(states_fc)
+        .filterDate(start, end)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
+        .median()
+    )
+    label = (
+        ee.ImageCollection(COLLECTION_IDS[DYNAMIC_WORLD])
+        .filterBounds(states_fc)
+        .filterDate(start, end)
+        .select("label")
+        .mode()
+    )
+    classes = ee.Image.cat([label.eq(i).rename(name) for i, name in enumerate(DYNAMIC_WORLD_CLASSES)])
+    return compute_indices(composite, SPECTRAL_METRICS).addBands(classes)
+
+
+def year_statistics(states_fc, year, scale, tile_scale):
+    """Per-state means of every metric for one year, as geometry-less features tagged with the year."""
+    reduced = annual_image(states_fc, year).reduceRegions(
+        collection=states_fc, reducer=ee.Reducer.mean(), scale=scale, tileScale=tile_scale
+    )
+    # Dropping the geometries keeps the response to a few properties per state
+    return reduced.map(lambda feature: ee.Feature(None, feature.toDictionary()).set("year", year))
+
+
+def fetch_batch(states_fc, years, scale, tile_scale, retries=3):
+    """Evaluates several years in one getInfo call. Returns {(state, year, metric): value}."""
+    collection = ee.FeatureCollection([year_statistics(states_fc, year, scale, tile_scale) for year in years]).flatten()
+    info = None
+    with span("ee.getInfo", kind="corpus_build", years=len(years)) as attributes:
+        for attempt in range(retries):
+            attributes["retries"] = attempt
+            try:
+                info = collection.getInfo()
+                break
+            except Exception as e:
+                if attempt == retries - 1:
+                    raise
+                logger.warning("Corpus batch %s failed (%s), retrying", years, e)
+                time.sleep(2 ** attempt)
+
+    values = {}
+    for feature in info["features"]:
+        properties = feature["properties"]
+        for metric in METRICS:
+            # Means are null where a year has no imagery over the state
+            if properties.get(metric) is not None:
+                values[(properties["state"], str(properties["year"]), metric)] = round(float(properties[metric]), 4)
+    return values
+
+
+def build_values(states, years, scale=1000, tile_scale=4, years_per_request=2, workers=4):
+    """Returns ({(state, year, metric): value}, failed years) for the states and years, batching years per request."""
+    states_fc = states_collection(states)
+    batches = [years[i:i + years_per_request] for i in range(0, len(years), years_per_request)]
+
+    def run(batch):
+        try:
+            return fetch_batch(states_fc, batch, scale, tile_scale), []
+        except Exception as e:
+            logger.error("Corpus batch %s failed: %s", batch, e)
+            return {}, batch
+
+    values = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+        for batch_values, batch_failed in executor.map(run, batches):
+            values.update(batch_values)
+            failed.extend(batch_failed)
+    return values, failed
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def corpus_cells(states):
+    """Returns the {(state, year, metric): value} cells already in the states' corpus files."""
+    return {key: value for key, value in get_corpus_index(states).items() if key[0] in states}
+
+
+def format_state_corpus(state, values):
+    """One state's corpus text: a '2023 Kerala' heading per year, then 'Sentinel2 NDVI at 0.41' lines."""
+    lines = []
+    for year in sorted({year for (s, year, _) in values if s == state}):
+        lines.append(f"{year} {state}")
+        for metric in METRICS:
+            value = values.get((state, year, metric))
+            if value is None:
+                continue
+            source = "Sentinel2" if metric in SPECTRAL_METRICS else "DynamicWorld"
+            lines.append(f"{source} {metric} at {value}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def write_corpus(values, states):
+    for state in states:
+        text = format_state_corpus(state, values)
+        if text:
+            _write_atomic(os.path.join(CORPUS_FOLDER, state_corpus_files[state]), text)
+
+
+def build_corpus(states, years, scale=1000, tile_scale=4, years_per_request=2, workers=4):
+    """
+    Refreshes the given states and years, merged into the cells already in their corpus
+    files (so a failed or partial run keeps older cells), rewrites those states' corpus
+    files and recompiles the corpus index from them. Returns a summary dict.
+    """
+    start = time.perf_counter()
+    values, failed = build_values(states, years, scale, tile_scale, years_per_request, workers)
+    table = corpus_cells(states)
+    table.update(values)
+    write_corpus(table, states)
+    get_corpus_index(states)
+    return {
+        "states": len(states),
+        "years": len(years),
+        "cells": len(values),
+        "requests": -(-len(years) // years_per_request),
+        "failed_years": failed,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", default=f"{DEFAULT_YEARS[0]}-{DEFAULT_YEARS[-1]}", help="e.g. 2015-2024 or 2019,2021")
+    parser.add_argument("--states", nargs="*", default=list(state_corpus_files))
+    parser.add_argument("--scale", type=float, default=1000, help="reduceRegions scale in meters")
+    parser.add_argument("--tile-scale", type=float, default=4, help="reduceRegions tileScale (raise on memory errors)")
+    parser.add_argument("--years-per-request", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4, help="Batches evaluated concurrently")
+    args = parser.parse_args()
+    configure_logging()
+
+    unknown = [state for state in args.states if state not in state_corpus_files]
+    if unknown:
+        logger.error("Unknown states: %s", ", ".join(unknown))
+        return 1
+    try:
+        ee.Initialize(project=EE_PROJECT)
+    except Exception:
+        ee.Authenticate()
+        ee.Initialize(project=EE_PROJECT)
+    summary = build_corpus(args.states, parse_years(args.years), args.scale, args.tile_scale,
+                           args.years_per_request, args.workers)
+    print(json.dumps(summary, indent=2))
+    return 0 if not summary["failed_years"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
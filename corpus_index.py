@@ -0,0 +1,182 @@
+# corpus_index.py
+"""
+Compiled (state, year, metric) -> value index over the CORPUS files, so
+numeric lookups can be answered locally before falling back to Mistral.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+from config import CORPUS_INDEX_PATH, MAX_YEAR, MIN_YEAR, state_corpus_files, DYNAMIC_WORLD_CLASSES
+from corpus_store import get_state_corpus
+from extraction import format_records
+from instrumentation import span
+from spectral_indices import SPECTRAL_INDICES
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+SPECTRAL_METRICS = list(SPECTRAL_INDICES)
+INDEX_METRICS = SPECTRAL_METRICS + DYNAMIC_WORLD_CLASSES
+
+# Shared with prompt_builder, so both readers of the corpus agree on years and metric names
+CANONICAL_METRICS = {metric.lower(): metric for metric in INDEX_METRICS}
+# Longest names first so no metric is shadowed by a shorter one sharing a prefix
+METRIC_ALTERNATION = "|".join(sorted((re.escape(m) for m in INDEX_METRICS), key=len, reverse=True))
+YEAR_PATTERN = re.compile(r"\b(" + "|".join(str(year) for year in range(MIN_YEAR, MAX_YEAR + 1)) + r")\b")
+_METRIC_PATTERN = re.compile(
+    r"(?:Sentinel2\s+|DynamicWorld\s+)?\b(" + METRIC_ALTERNATION + r")\b\s*(?:at|is|:|=)\s*(-?\d+(?:\.\d+)?)",
+    re.IGNORECASE,
+)
+
+_lock = threading.Lock()
+_index = None
+
+
+def _empty_index():
+    return {"version": INDEX_VERSION, "sources": {},
+            "columns": {"state": [], "year": [], "metric": [], "value": []}, "cells": {}}
+
+
+def parse_corpus_text(text):
+    """Returns {(year, metric): value} for every unambiguous cell in one state's corpus."""
+    cells = {}
+    conflicts = set()
+    current_year = None
+    for line in text.splitlines():
+        year_match = YEAR_PATTERN.search(line)
+        if year_match:
+            current_year = year_match.group(1)
+        if not current_year:
+            continue
+        for metric, value in _METRIC_PATTERN.findall(line):
+            key = (current_year, CANONICAL_METRICS[metric.lower()])
+            value = float(value)
+            if key in cells and cells[key] != value:
+                conflicts.add(key)
+            cells.setdefault(key, value)
+    # Cells reported with different values are left to the LLM to disambiguate
+    for key in conflicts:
+        del cells[key]
+    return cells
+
+
+def _load_persisted():
+    if not os.path.exists(CORPUS_INDEX_PATH):
+        return _empty_index()
+    try:
+        with open(CORPUS_INDEX_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable corpus index %s: %s", CORPUS_INDEX_PATH, e)
+        return _empty_index()
+    if data.get("version") != INDEX_VERSION:
+        return _empty_index()
+    columns = data["columns"]
+    data["cells"] = {
+        (state, year, metric): value
+        for state, year, metric, value in zip(columns["state"], columns["year"], columns["metric"], columns["value"])
+    }
+    return data
+
+
+def _persist(index):
+    columns = {"state": [], "year": [], "metric": [], "value": []}
+    for (state, year, metric), value in sorted(index["cells"].items()):
+        columns["state"].append(state)
+        columns["year"].append(year)
+        columns["metric"].append(metric)
+        columns["value"].append(value)
+    index["columns"] = columns
+    os.makedirs(os.path.dirname(CORPUS_INDEX_PATH), exist_ok=True)
+    tmp_path = CORPUS_INDEX_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "sources": index["sources"], "columns": columns}, f)
+    os.replace(tmp_path, CORPUS_INDEX_PATH)
+
+
+def _refresh(index, states):
+    changed = False
+    for state in states:
+        if state not in state_corpus_files:
+            continue
+        source = index["sources"].get(state)
+        entry = get_state_corpus(state)
+        if entry is None:
+            if source is not None:
+                index["cells"] = {k: v for k, v in index["cells"].items() if k[0] != state}
+                del index["sources"][state]
+                changed = True
+            continue
+        text, (mtime, size) = entry
+        signature = {"mtime": mtime, "size": size}
+        if source == signature:
+            continue
+        with span("corpus.index", state=state) as attributes:
+            parsed = parse_corpus_text(text)
+            attributes["values"] = len(parsed)
+        index["cells"] = {k: v for k, v in index["cells"].items() if k[0] != state}
+        index["cells"].update({(state, year, metric): value for (year, metric), value in parsed.items()})
+        index["sources"][state] = signature
+        changed = True
+        logger.debug("Indexed %d corpus values for %s", len(parsed), state)
+    return changed
+
+
+def get_corpus_index(states=None):
+    """Returns the {(state, year, metric): value} table, recompiling any stale corpus files."""
+    global _index
+    with _lock:
+        if _index is None:
+            _index = _load_persisted()
+        if _refresh(_index, states if states is not None else list(state_corpus_files.keys())):
+            try:
+                _persist(_index)
+            except OSError as e:
+                logger.warning("Failed to persist corpus index: %s", e)
+        return _index["cells"]
+
+
+def lookup_values(states, year_dict, metrics):
+    """Returns {(state, year, metric): value} only if every requested cell is in the index."""
+    cells = get_corpus_index(states)
+    values = {}
+    for state in states:
+        for year in year_dict.get(state, [str(MAX_YEAR)]):
+            for metric in metrics:
+                value = cells.get((state, str(year), metric))
+                if value is None:
+                    return None
+                values[(state, str(year), metric)] = value
+    return values
+
+
+def format_values(values, states, year_dict, metrics):
+    """Formats index values the way call_mistral_saba responses are laid out."""
+    lines = []
+    for state in states:
+        for year in year_dict.get(state, [str(MAX_YEAR)]):
+            lines.append(f"{year} {state}")
+            for metric in metrics:
+                lines.append(f"- {metric}: {values[(state, str(year), metric)]}")
+    lines.append("Data sourced from Sentinel-2 and Dynamic World.")
+    return "\n".join(lines)
+
+
+def answer_from_index(states, year_dict, metrics, structured=False):
+    """
+    Answers a query from the local index, or returns None so the caller can ask Mistral.
+    With structured=True the answer is the same JSON records document Mistral is asked for.
+    """
+    try:
+        values = lookup_values(states, year_dict, metrics)
+    except OSError as e:
+        logger.warning("Corpus index lookup failed: %s", e)
+        return None
+    if values is None:
+        return None
+    if structured:
+        return format_records(values)
+    return format_values(values, states, year_dict, metrics)
@@ -0,0 +1,67 @@
+# corpus_store.py
+"""
+Process-wide store of the CORPUS files. Each file is read once, re-read only
+when its mtime or size changes, and shared (as the same interned string) by
+every module and Streamlit session.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from config import CORPUS_FOLDER, state_corpus_files
+from instrumentation import span
+
+_MAX_COMBINED_ENTRIES = 64
+
+_lock = threading.Lock()
+_texts = {}
+_combined = OrderedDict()
+
+
+def _corpus_path(state):
+    return os.path.join(CORPUS_FOLDER, state_corpus_files.get(state, ""))
+
+
+def get_state_corpus(state):
+    """Returns (text, signature) for a state's corpus file, or None if it does not exist."""
+    path = _corpus_path(state)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    signature = (stat.st_mtime, stat.st_size)
+    with _lock:
+        cached = _texts.get(state)
+        if cached and cached[1] == signature:
+            return cached
+    with span("corpus.read", state=state, bytes=stat.st_size), open(path, "r", encoding="utf-8") as f:
+        entry = (sys.intern(f.read()), signature)
+    with _lock:
+        _texts[state] = entry
+    return entry
+
+
+def get_corpus(states):
+    """Returns the '--- State ---' separated corpus text of the given states, skipping missing files."""
+    parts = []
+    signatures = []
+    for state in states:
+        entry = get_state_corpus(state)
+        if entry is None:
+            continue
+        parts.append((state, entry[0]))
+        signatures.append((state, entry[1]))
+    key = tuple(signatures)
+    with _lock:
+        if key in _combined:
+            _combined.move_to_end(key)
+            return _combined[key]
+    combined = "".join(f"\n--- {state} ---\n" + text for state, text in parts)
+    with _lock:
+        _combined[key] = combined
+        while len(_combined) > _MAX_COMBINED_ENTRIES:
+            _combined.popitem(last=False)
+    return combined
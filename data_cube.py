@@ -0,0 +1,110 @@
+# data_cube.py
+"""
+Dense states x years x metrics cube of extracted values, with masks for the
+cells that were observed and the years that apply to each state. Charts,
+normalization and missing-value checks operate on whole arrays.
+"""
+import logging
+
+import numpy as np
+
+from config import MAX_YEAR, MIN_YEAR
+
+logger = logging.getLogger(__name__)
+
+
+def valid_years(years):
+    """Sorted, de-duplicated years within the supported range, as strings."""
+    if not isinstance(years, list):
+        years = [years]
+    return sorted(set(str(y) for y in years if MIN_YEAR <= int(y) <= MAX_YEAR))
+
+
+class DataCube:
+    def __init__(self, states, year_dict, metrics):
+        self.states = list(states)
+        self.metrics = list(metrics)
+        state_years = [valid_years(year_dict.get(state, [str(MAX_YEAR)])) for state in self.states]
+        self.years = sorted(set(year for years in state_years for year in years))
+        self._state_index = {state: i for i, state in enumerate(self.states)}
+        self._year_index = {year: i for i, year in enumerate(self.years)}
+        self._metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+
+        shape = (len(self.states), len(self.years), len(self.metrics))
+        self.values = np.zeros(shape)
+        self.observed = np.zeros(shape, dtype=bool)
+        # valid[s, y] is True when year y was requested for state s
+        self.valid = np.zeros(shape[:2], dtype=bool)
+        self._columns = []
+        for s, years in enumerate(state_years):
+            columns = np.array([self._year_index[year] for year in years], dtype=int)
+            self.valid[s, columns] = True
+            self._columns.append((years, columns))
+
+    @classmethod
+    def from_records(cls, records, states, year_dict, metrics):
+        cube = cls(states, year_dict, metrics)
+        cube.update(records)
+        return cube
+
+    def update(self, records):
+        """Writes {(state, year, metric): value} records that fall inside the cube."""
+        if not records:
+            return
+        s = np.array([self._state_index.get(state, -1) for state, _, _ in records])
+        y = np.array([self._year_index.get(year, -1) for _, year, _ in records])
+        m = np.array([self._metric_index.get(metric, -1) for _, _, metric in records])
+        v = np.fromiter(records.values(), dtype=float, count=len(records))
+        keep = (s >= 0) & (y >= 0) & (m >= 0)
+        keep[keep] = self.valid[s[keep], y[keep]]
+        self.values[s[keep], y[keep], m[keep]] = v[keep]
+        self.observed[s[keep], y[keep], m[keep]] = True
+
+    def state_values(self, state):
+        """(years, values[years x metrics]) for the years requested for `state`."""
+        years, columns = self._columns[self._state_index[state]]
+        return years, self.values[self._state_index[state], columns]
+
+    def missing(self):
+        """{state: [years]} for requested state-years whose values are all zero."""
+        empty = self.valid & ~(self.values != 0).any(axis=2)
+        missing = {}
+        for s, y in zip(*np.nonzero(empty)):
+            missing.setdefault(self.states[s], []).append(self.years[y])
+        return missing
+
+    def normalize(self, tolerance=0.01):
+        """Rescales every state-year whose metrics do not sum to 1 (land-cover shares)."""
+        totals = self.values.sum(axis=2, keepdims=True)
+        rescale = (totals > 0) & (np.abs(totals - 1.0) > tolerance)
+        if rescale.any():
+            logger.debug("Normalizing land cover data for %d state-years", int(rescale.sum()))
+        self.values = np.where(rescale, self.values / np.where(totals > 0, totals, 1.0), self.values)
+
+    def observed_table(self):
+        """
+        Returns (rows, values, present) for the state-years with at least one observed
+        value: their (state, year) labels, a rows x metrics array with unobserved cells
+        as 0, and which metrics were observed anywhere.
+        """
+        s, y = np.nonzero(self.valid & self.observed.any(axis=2))
+        observed = self.observed[s, y]
+        values = np.where(observed, self.values[s, y], 0.0)
+        rows = [(self.states[i], self.years[j]) for i, j in zip(s, y)]
+        return rows, values, observed.any(axis=0)
+
+    def row(self, state, year):
+        return self.values[self._state_index[state], self._year_index[year]]
+
+    def series(self, state, metric):
+        """(years, values) of one metric over the years requested for `state`."""
+        years, columns = self._columns[self._state_index[state]]
+        return years, self.values[self._state_index[state], columns, self._metric_index[metric]]
+
+    def has_data(self, metric):
+        """Per-state flags: does `metric` have a positive value in any requested year."""
+        return ((self.values[:, :, self._metric_index[metric]] > 0) & self.valid).any(axis=1)
+
+    def to_dict(self):
+        """Nested {state: {year: [values]}} view, for logging."""
+        return {state: {year: row.tolist() for year, row in zip(*self.state_values(state))} for state in self.states}
@@ -0,0 +1,100 @@
+# disk_cache.py
+"""
+Small SQLite-backed key/value cache with a TTL, shared by the caches that
+need to survive process restarts.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(recipe):
+    """Deterministic hash of a JSON-serializable recipe."""
+    return hashlib.sha256(json.dumps(recipe, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def file_signature(path):
+    """[mtime, size] of a source file, for invalidating what was derived from it; None if it is missing."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+
+class DiskCache:
+    def __init__(self, path, ttl, max_entries=10000, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with closing(self._connect()) as conn, conn:
+                    row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        return None
+                    if now - row[1] > self.ttl:
+                        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        return None
+                    conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                    return json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("Cache read failed for %s: %s", self.path, e)
+                return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with closing(self._connect()) as conn, conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value), now, now),
+                    )
+                    conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM entries WHERE key IN ("
+                        "SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                    if self.max_bytes:
+                        self._evict_to_size(conn)
+            except (sqlite3.Error, TypeError) as e:
+                logger.warning("Cache write failed for %s: %s", self.path, e)
+
+    def _evict_to_size(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, LENGTH(value) FROM entries ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
@@ -0,0 +1,97 @@
+# extraction.py
+"""
+Parsing of extracted (state, year, metric, value) records. Mistral is asked for
+JSON matching EXTRACTION_SCHEMA, which is loaded with a strict parser; the
+legacy free-text regex parser is only used when the response is not valid JSON.
+"""
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_SCHEMA = {
+    "records": [
+        {"state": "Kerala", "year": "2023", "metric": "NDVI", "value": 0.415}
+    ]
+}
+
+_TEXT_PATTERN = re.compile(r"(?:(\d{4})\s+([A-Za-z\s]+)\n)?-?\s*(?:DynamicWorld\s+)?(\w+)\s*:\s*(\d+\.\d+)")
+_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def schema_instruction():
+    return (
+        "Respond with a single JSON object and nothing else, shaped like "
+        f"{json.dumps(EXTRACTION_SCHEMA)}: one record per state, year and metric, "
+        "with the year as a string and the value as a number. "
+        "If there is no relevant data, return {\"records\": []}."
+    )
+
+
+def format_records(values):
+    """Serializes {(state, year, metric): value} as an EXTRACTION_SCHEMA document."""
+    return json.dumps({"records": [
+        {"state": state, "year": year, "metric": metric, "value": value}
+        for (state, year, metric), value in values.items()
+    ]})
+
+
+def parse_json_records(text, states, metrics):
+    """
+    Strict parser for EXTRACTION_SCHEMA responses. Returns {(state, year, metric): value}
+    for the valid records naming a requested state and metric, or None if the text is
+    not a schema document (so the caller can fall back to the text parser). Malformed
+    records (e.g. a null value) are skipped without discarding the others.
+    """
+    if not text:
+        return None
+    try:
+        document = json.loads(_FENCE_PATTERN.sub("", text.strip()))
+    except ValueError:
+        return None
+    if not isinstance(document, dict) or not isinstance(document.get("records"), list):
+        return None
+
+    canonical_states = {state.lower(): state for state in states}
+    requested_metrics = set(metrics)
+    values = {}
+    skipped = 0
+    for record in document["records"]:
+        try:
+            state = canonical_states.get(str(record["state"]).strip().lower())
+            year = str(int(record["year"]))
+            metric = str(record["metric"]).strip()
+            value = float(record["value"])
+        except (KeyError, TypeError, ValueError):
+            skipped += 1
+            continue
+        if state and metric in requested_metrics:
+            values[(state, year, metric)] = value
+    if skipped:
+        logger.warning("Skipped %d malformed extraction records of %d", skipped, len(document["records"]))
+    return values
+
+
+def parse_text_records(text, states, metrics):
+    """Regex fallback for free-text responses laid out as '2023 Kerala' headings followed by '- NDVI: 0.415'."""
+    values = {}
+    current_state = None
+    current_year = None
+    for year, state_name, metric, value in _TEXT_PATTERN.findall(text or ""):
+        state_name = state_name.strip() if state_name else None
+        if state_name and year:
+            current_state = next((s for s in states if s.lower() == state_name.lower()), None)
+            current_year = year
+        if current_state and current_year and metric in metrics:
+            values[(current_state, current_year, metric)] = float(value)
+    return values
+
+
+def parse_records(text, states, metrics):
+    """Returns {(state, year, metric): value}, from JSON when possible and free text otherwise."""
+    values = parse_json_records(text, states, metrics)
+    if values is not None:
+        return values
+    logger.info("Extraction response is not schema JSON, falling back to text parsing")
+    return parse_text_records(text, states, metrics)
@@ -0,0 +1,140 @@
+# geometry_store.py
+"""
+Process-wide cache of GADM state geometries. The shapefile is read once and
+re-read only when it changes on disk. Each state is the union of all of its
+rows, and is served at several levels of detail, each simplified (topology
+preserved) and converted on first use:
+
+    "full"     the unioned GADM polygons (local zonal statistics)
+    "clip"     GEOMETRY_CLIP_TOLERANCE, for clip() and reduceRegions
+    "display"  GEOMETRY_DISPLAY_TOLERANCE, for boundary outlines at map zoom
+    "bbox"     the bounding box, for filterBounds() and centering
+"""
+import hashlib
+import json
+import logging
+import threading
+
+import ee
+import geopandas as gpd
+import shapely
+from shapely.geometry import box
+
+from config import GEOMETRY_CLIP_TOLERANCE, GEOMETRY_DISPLAY_TOLERANCE, SHAPEFILE_PATH
+from disk_cache import file_signature
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("full", "clip", "display", "bbox")
+
+_lock = threading.Lock()
+_source_signature = None
+_shape_by_state = {}
+_level_shapes = {}
+_geojson_by_key = {}
+_ee_geometry_by_key = {}
+_centroid_by_state = {}
+_digest_by_key = {}
+
+
+def _ensure_loaded():
+    global _source_signature, _shape_by_state, _level_shapes, _geojson_by_key, _ee_geometry_by_key
+    global _centroid_by_state, _digest_by_key
+    signature = file_signature(SHAPEFILE_PATH)
+    if signature == _source_signature:
+        return
+    with span("geometry.load", path=SHAPEFILE_PATH):
+        gdf = gpd.read_file(SHAPEFILE_PATH, columns=["NAME_1"])
+    gdf = gdf[gdf.geometry.notna()]
+    # A state can span several rows (e.g. island groups); the union covers all of them
+    shape_by_state = {
+        name: shapely.make_valid(shapely.union_all(group.geometry.values))
+        for name, group in gdf.groupby(gdf["NAME_1"].str.title())
+    }
+    _shape_by_state = shape_by_state
+    _centroid_by_state = {name: (shape.centroid.x, shape.centroid.y) for name, shape in shape_by_state.items()}
+    _level_shapes = {}
+    _geojson_by_key = {}
+    _ee_geometry_by_key = {}
+    _digest_by_key = {}
+    _source_signature = signature
+    logger.info("Loaded %d state geometries from %s", len(shape_by_state), SHAPEFILE_PATH)
+
+
+def _level_shape(state, level):
+    if level not in LEVELS:
+        raise ValueError(f"Unknown geometry level: {level}")
+    shape = _shape_by_state.get(state)
+    if shape is None or level == "full":
+        return shape
+    key = (state, level)
+    if key not in _level_shapes:
+        if level == "bbox":
+            _level_shapes[key] = box(*shape.bounds)
+        else:
+            tolerance = GEOMETRY_CLIP_TOLERANCE if level == "clip" else GEOMETRY_DISPLAY_TOLERANCE
+            with span("geometry.simplify", state=state, level=level) as attributes:
+                simplified = shape.simplify(tolerance, preserve_topology=True)
+                attributes.update(vertices=shapely.get_num_coordinates(shape),
+                                  simplified_vertices=shapely.get_num_coordinates(simplified))
+            _level_shapes[key] = simplified
+    return _level_shapes[key]
+
+
+def _geojson(state, level):
+    key = (state, level)
+    if key not in _geojson_by_key:
+        shape = _level_shape(state, level)
+        if shape is None:
+            return None
+        _geojson_by_key[key] = shape.__geo_interface__
+    return _geojson_by_key[key]
+
+
+def get_state_geojson(state, level="full"):
+    """Returns the GeoJSON geometry of a state at `level`, or None if the shapefile has no such state."""
+    with _lock:
+        _ensure_loaded()
+        return _geojson(state, level)
+
+
+def get_state_geometry(state, level="clip"):
+    """Returns a cached ee.Geometry for a state at `level`, or None if the shapefile has no such state."""
+    with _lock:
+        _ensure_loaded()
+        key = (state, level)
+        if key not in _ee_geometry_by_key:
+            geojson = _geojson(state, level)
+            if geojson is None:
+                return None
+            # Planar edges, as drawn in the shapefile's lat/lon coordinates (and for straight bbox sides)
+            _ee_geometry_by_key[key] = ee.Geometry(geojson, None, False)
+        return _ee_geometry_by_key[key]
+
+
+def get_state_geometries(state):
+    """Returns {level: ee.Geometry} for the levels maps use ("bbox", "clip", "display"), or None."""
+    geometries = {level: get_state_geometry(state, level) for level in ("bbox", "clip", "display")}
+    return None if geometries["clip"] is None else geometries
+
+
+def get_state_centroid(state):
+    """Returns the (lon, lat) centroid of a state, computed locally so maps can be centered without EE."""
+    with _lock:
+        _ensure_loaded()
+        return _centroid_by_state.get(state)
+
+
+def get_state_geometry_digest(state, level="clip"):
+    """Returns a stable hash of a state's geometry at `level`, used in cache keys of EE results."""
+    with _lock:
+        _ensure_loaded()
+        key = (state, level)
+        if key not in _digest_by_key:
+            geojson = _geojson(state, level)
+            if geojson is None:
+                return None
+            _digest_by_key[key] = hashlib.sha1(
+                json.dumps({"level": level, "geometry": geojson}, sort_keys=True).encode("utf-8")).hexdigest()
+        return _digest_by_key[key]
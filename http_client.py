@@ -0,0 +1,67 @@
+# http_client.py
+"""
+Shared HTTP client with connection pooling and keep-alive, plus an asyncio
+fan-out helper for issuing many JSON POST requests under a concurrency cap.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_SIZE, MISTRAL_MAX_CONCURRENCY
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide requests.Session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=["POST"])
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def post_json(url, payload, headers, timeout=30):
+    """POSTs a JSON payload over the pooled session and returns the decoded JSON response."""
+    response = get_session().post(url, json=payload, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _post_json_bounded(semaphore, url, payload, headers, timeout):
+    async with semaphore:
+        return await asyncio.to_thread(post_json, url, payload, headers, timeout)
+
+
+async def post_json_many_async(url, payloads, headers, concurrency=MISTRAL_MAX_CONCURRENCY, timeout=30):
+    """
+    POSTs every payload concurrently (at most `concurrency` in flight) and returns
+    the decoded responses in input order; failed requests are returned as exceptions.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(
+        *(_post_json_bounded(semaphore, url, payload, headers, timeout) for payload in payloads),
+        return_exceptions=True,
+    )
+
+
+def post_json_many(url, payloads, headers, concurrency=MISTRAL_MAX_CONCURRENCY, timeout=30):
+    """Synchronous entry point for post_json_many_async, safe to call from a thread with a running loop."""
+    coroutine = post_json_many_async(url, payloads, headers, concurrency, timeout)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
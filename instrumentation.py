@@ -0,0 +1,168 @@
+# instrumentation.py
+"""
+Lightweight tracing and metrics. span() times a block and records it in a
+process-wide registry (count, errors, latency histogram per span name) and as
+a structured JSON log line; the registry is served in Prometheus text and JSON
+formats, optionally over HTTP on METRICS_PORT.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import LOG_LEVEL, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = {"count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+            entry["count"] += 1
+            entry["errors"] += int(error)
+            entry["sum"] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "spans": {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in self._spans.items()},
+                "counters": dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the enclosed block as span `name`. Yields the attribute dict, so callers
+    can add results (tokens, retries, cache hits) before the span closes.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe(name, seconds, error is not None)
+        if logger.isEnabledFor(logging.INFO):
+            record = {"span": name, "duration_ms": round(seconds * 1000, 2), **attributes}
+            if error is not None:
+                record["error"] = str(error)
+            logger.info("%s", json.dumps(record, default=str))
+
+
+def increment(name, value=1):
+    registry.increment(name, value)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0.0 when empty); `fraction` is in [0, 1]."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def _metric_name(name):
+    return "geo_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text():
+    snapshot = registry.snapshot()
+    lines = [
+        "# HELP geo_span_seconds Duration of instrumented spans.",
+        "# TYPE geo_span_seconds histogram",
+    ]
+    for name, entry in sorted(snapshot["spans"].items()):
+        for bound, count in zip(BUCKETS, entry["buckets"]):
+            lines.append(f'geo_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+        lines.append(f'geo_span_seconds_bucket{{span="{name}",le="+Inf"}} {entry["count"]}')
+        lines.append(f'geo_span_seconds_sum{{span="{name}"}} {entry["sum"]:.6f}')
+        lines.append(f'geo_span_seconds_count{{span="{name}"}} {entry["count"]}')
+    lines.append("# HELP geo_span_errors_total Spans that raised.")
+    lines.append("# TYPE geo_span_errors_total counter")
+    for name, entry in sorted(snapshot["spans"].items()):
+        lines.append(f'geo_span_errors_total{{span="{name}"}} {entry["errors"]}')
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"# TYPE {_metric_name(name)}_total counter")
+        lines.append(f"{_metric_name(name)}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_json():
+    return json.dumps(registry.snapshot())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = metrics_json(), "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serves /metrics (Prometheus) and /metrics.json on `port`; once per process, and not at all when port is 0."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logger.info("Metrics endpoint listening on port %s", port)
+        return _server
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Sets up leveled logging for the app and CLIs (no-op if the root logger is already configured)."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
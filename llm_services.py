@@ -2,54 +2,128 @@
 """
 Functions for interacting with external language model APIs (Mistral, Gemini).
 """
+import logging
 import time
+
 import requests
 import google.generativeai as genai
 
-from utils import extract_year, clean_response
+from config import MISTRAL_MAX_CONCURRENCY
+from extraction import schema_instruction
+from http_client import post_json, post_json_many
+from instrumentation import increment, span
+from prompt_builder import estimate_tokens
+from response_cache import mistral_cache, mistral_cache_key
+from utils import clean_response, clean_response_chunk
 
-def call_mistral_saba(api_url, api_key, corpus, query, states, metrics=None):
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    instruction = (
-        "Provide a response using only numerical values from the corpus. "
-        "List metrics and values (e.g., '2023 NDVI: 0.415 Kerala' or '2023 water: 0.2 Kerala') with corresponding years and states. "
-        "For land cover, include requested Dynamic World classes (water, trees, grass, flooded_vegetation, crops, shrub_and_scrub, built, bare, snow_and_ice) with values summing to 1.0 per year and state, prefixed with 'DynamicWorld' (e.g., 'DynamicWorld water: 0.1'). "
-        "If metrics are specified, only include those; otherwise, include all requested data. "
-        "If multiple states or years are requested, provide data for each state-year combination separately. "
-        "If no data, return 'No relevant data'. "
-        "End with: 'Data sourced from Sentinel-2 and Dynamic World.'"
-    )
-    year_dict = extract_year(query)
-    year_str = ""
-    for state in states:
-        years = year_dict.get(state, ["2024"])
-        year_str += f"{state}: {', '.join(years)}; "
-    
+logger = logging.getLogger(__name__)
+
+MISTRAL_MODEL = "mistral-saba-2502"
+
+def _mistral_headers(api_key):
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+
+def _mistral_request(corpus, query, states, metrics=None, structured=False):
+    """
+    Builds the chat-completions payload and its response cache key. In structured
+    mode the model is asked for JSON records (see extraction.EXTRACTION_SCHEMA).
+    """
+    if structured:
+        instruction = (
+            "Provide a response using only numerical values from the corpus. "
+            "For land cover, include requested Dynamic World classes (water, trees, grass, flooded_vegetation, crops, shrub_and_scrub, built, bare, snow_and_ice) with values summing to 1.0 per year and state. "
+            "If multiple states or years are requested, provide a record for each state-year-metric combination. "
+            + schema_instruction()
+        )
+    else:
+        instruction = (
+            "Provide a response using only numerical values from the corpus. "
+            "List metrics and values (e.g., '2023 NDVI: 0.415 Kerala' or '2023 water: 0.2 Kerala') with corresponding years and states. "
+            "For land cover, include requested Dynamic World classes (water, trees, grass, flooded_vegetation, crops, shrub_and_scrub, built, bare, snow_and_ice) with values summing to 1.0 per year and state, prefixed with 'DynamicWorld' (e.g., 'DynamicWorld water: 0.1'). "
+            "If metrics are specified, only include those; otherwise, include all requested data. "
+            "If multiple states or years are requested, provide data for each state-year combination separately. "
+            "If no data, return 'No relevant data'. "
+            "End with: 'Data sourced from Sentinel-2 and Dynamic World.'"
+        )
     metric_instruction = f"Metrics requested: {', '.join(metrics)}" if metrics else "All available metrics"
+    system_prompt = f"You are an AI trained on environmental data. {instruction}\n{metric_instruction}"
+    cache_key = mistral_cache_key(MISTRAL_MODEL, system_prompt, corpus, query, states, metrics)
     payload = {
-        "model": "mistral-saba-2502",
+        "model": MISTRAL_MODEL,
         "messages": [
-            {"role": "system", "content": f"You are an AI trained on environmental data. {instruction}\n{metric_instruction}"},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Context: {corpus}\nQuery: {query} for {', '.join(states)}"}
         ]
     }
-    try:
-        for attempt in range(3):
-            try:
-                response = requests.post(api_url, json=payload, headers=headers, timeout=30)
-                response.raise_for_status()
-                break
-            except requests.exceptions.RequestException as e:
-                if attempt == 2:
-                    return f"API Error: {str(e)}"
-                time.sleep(1)
-        raw_response = response.json()
-        print(f"Raw API Response: {raw_response}")
-        return raw_response.get("choices", [{}])[0].get("message", {}).get("content", "No response")
-    except requests.exceptions.RequestException as e:
-        return f"API Error: {str(e)}"
+    if structured:
+        payload["response_format"] = {"type": "json_object"}
+    return cache_key, payload
 
-def call_gemini(api_key, context, query, states, mistral_values):
+
+def _mistral_content(raw_response, cache_key, attributes=None):
+    logger.debug("Raw API Response: %s", raw_response)
+    usage = raw_response.get("usage") or {}
+    if attributes is not None:
+        attributes["prompt_tokens"] = usage.get("prompt_tokens", attributes.get("prompt_tokens"))
+        attributes["completion_tokens"] = usage.get("completion_tokens")
+    increment("mistral_prompt_tokens", usage.get("prompt_tokens", 0))
+    increment("mistral_completion_tokens", usage.get("completion_tokens", 0))
+    content = raw_response.get("choices", [{}])[0].get("message", {}).get("content")
+    if not content:
+        return "No response"
+    mistral_cache.set(cache_key, content)
+    return content
+
+
+def call_mistral_saba(api_url, api_key, corpus, query, states, metrics=None, structured=False):
+    cache_key, payload = _mistral_request(corpus, query, states, metrics, structured)
+    with span("llm.mistral", states=len(states), metrics=len(metrics or []), structured=structured,
+              prompt_tokens=estimate_tokens(corpus)) as attributes:
+        cached = mistral_cache.get(cache_key)
+        attributes["cache_hit"] = cached is not None
+        if cached is not None:
+            logger.debug("Mistral cache hit: %s", mistral_cache.stats())
+            return cached
+
+        try:
+            raw_response = post_json(api_url, payload, _mistral_headers(api_key))
+        except requests.exceptions.RequestException as e:
+            attributes["error"] = str(e)
+            return f"API Error: {str(e)}"
+        return _mistral_content(raw_response, cache_key, attributes)
+
+
+def call_mistral_saba_many(api_url, api_key, calls, concurrency=MISTRAL_MAX_CONCURRENCY):
+    """
+    Runs several call_mistral_saba requests concurrently over the pooled client.
+    `calls` is a list of dicts with corpus, query, states, metrics and optionally
+    structured; responses (or 'API Error' strings) are returned in the same order.
+    """
+    results = [None] * len(calls)
+    pending = []
+    for i, call in enumerate(calls):
+        cache_key, payload = _mistral_request(call["corpus"], call["query"], call["states"], call.get("metrics"),
+                                              call.get("structured", False))
+        cached = mistral_cache.get(cache_key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, cache_key, payload))
+
+    if pending:
+        with span("llm.mistral_many", requests=len(pending), cache_hits=len(calls) - len(pending),
+                  concurrency=concurrency) as attributes:
+            responses = post_json_many(api_url, [payload for _, _, payload in pending], _mistral_headers(api_key), concurrency)
+            for (i, cache_key, _), raw_response in zip(pending, responses):
+                if isinstance(raw_response, Exception):
+                    results[i] = f"API Error: {str(raw_response)}"
+                else:
+                    results[i] = _mistral_content(raw_response, cache_key)
+            attributes["errors"] = sum(1 for i, _, _ in pending if results[i].startswith("API Error"))
+    return results
+
+def _gemini_model_and_prompt(api_key, context, query, states, mistral_values):
     genai.configure(api_key=api_key)
     model = genai.GenerativeModel("gemini-2.0-flash")
     instruction = (
@@ -62,5 +136,57 @@ def call_gemini(api_key, context, query, states, mistral_values):
         "End the response with: 'Data sourced from Sentinel-2 and Dynamic World.'"
     )
     context_with_values = f"Context: {context}\nMistral Values: {mistral_values}\nQuery: {query} for {', '.join(states)}\n{instruction}"
-    response = model.generate_content(context_with_values)
+    return model, context_with_values
+
+
+def call_gemini(api_key, context, query, states, mistral_values):
+    model, context_with_values = _gemini_model_and_prompt(api_key, context, query, states, mistral_values)
+    with span("llm.gemini", states=len(states), prompt_tokens=estimate_tokens(context_with_values)):
+        response = model.generate_content(context_with_values)
     return clean_response(response.text) if hasattr(response, "text") else "Error generating response"
+
+
+def call_gemini_stream(api_key, context, query, states, mistral_values):
+    """
+    Streaming variant of call_gemini. Yields cleaned report text as it arrives;
+    text is released line by line so clean_response patterns are never split.
+    """
+    model, context_with_values = _gemini_model_and_prompt(api_key, context, query, states, mistral_values)
+    with span("llm.gemini_stream", states=len(states), prompt_tokens=estimate_tokens(context_with_values)) as attributes:
+        yield from _gemini_stream_chunks(model, context_with_values, attributes)
+
+
+def _gemini_stream_chunks(model, context_with_values, attributes):
+    buffer = ""
+    emitted = False
+    start = time.perf_counter()
+    try:
+        for chunk in model.generate_content(context_with_values, stream=True):
+            if "first_chunk_ms" not in attributes:
+                attributes["first_chunk_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            try:
+                buffer += chunk.text
+                attributes["completion_tokens"] = attributes.get("completion_tokens", 0) + estimate_tokens(chunk.text)
+            except ValueError:
+                continue
+            if "\n" not in buffer:
+                continue
+            complete, buffer = buffer.rsplit("\n", 1)
+            text = clean_response_chunk(complete + "\n")
+            if not emitted:
+                text = text.lstrip()
+            if text:
+                emitted = True
+                yield text
+    except Exception as e:
+        # Re-raised so the report stage fails instead of saving a truncated report as complete
+        logger.error("Gemini streaming failed: %s", e)
+        attributes["error"] = str(e)
+        raise
+    text = clean_response_chunk(buffer).rstrip()
+    if not emitted:
+        text = text.lstrip()
+        if not text:
+            text = "Error generating response"
+    if text:
+        yield text
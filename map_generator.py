@@ -2,13 +2,20 @@
 """
 Functions for Google Earth Engine (GEE) initialization and map generation.
 """
+import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import ee
 import geemap.foliumap as geemap
-import geopandas as gpd
 
-from config import (EE_PROJECT, SHAPEFILE_PATH, DYNAMIC_WORLD_CLASSES, LAND_COVER_LEGEND, LAND_COVER_CAPTION)
+from config import (EE_PROJECT, SHAPEFILE_PATH, MAP_BUILD_WORKERS, DYNAMIC_WORLD_CLASSES, LAND_COVER_LEGEND, LAND_COVER_CAPTION,
+                    LAND_COVER_VIS, MAX_YEAR, MIN_YEAR, COLLECTION_IDS, DYNAMIC_WORLD, SENTINEL2)
+from geometry_store import get_state_centroid, get_state_geometries, get_state_geometry_digest
+from instrumentation import span
+from spectral_indices import REFLECTANCE_SCALE, SPECTRAL_INDICES, compute_indices, requested_indices
+from tile_cache import add_cached_layer, get_cached, put_cached
 from utils import extract_metrics_from_query
 
 # Initialize Earth Engine
@@ -18,134 +25,272 @@ except Exception:
     ee.Authenticate()
     ee.Initialize(project=EE_PROJECT)
 
-def generate_map(states, year_dict, query, result_queue):
+logger = logging.getLogger(__name__)
+
+
+def _sentinel2_collection(geom, year):
+    return (
+        ee.ImageCollection(COLLECTION_IDS[SENTINEL2])
+        .filterBounds(geom)
+        .filterDate(f"{year}-01-01", f"{year}-12-31")
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
+        .sort("system:time_start", False)
+    )
+
+
+def _dynamic_world_collection(geom, year):
+    return (
+        ee.ImageCollection(COLLECTION_IDS[DYNAMIC_WORLD])
+        .filterBounds(geom)
+        .filterDate(f"{year}-01-01", f"{year}-12-31")
+        .sort("system:time_start", False)
+    )
+
+
+_COLLECTION_BUILDERS = {SENTINEL2: _sentinel2_collection, DYNAMIC_WORLD: _dynamic_world_collection}
+
+
+def _metadata_recipe(state, year, dataset):
+    return {"kind": "collection_metadata", "collection": COLLECTION_IDS[dataset], "year": year,
+            "state": state, "geometry": get_state_geometry_digest(state, "bbox")}
+
+
+def resolve_collection_metadata(items):
+    """
+    Fetches the size and latest timestamp of every (state, year, dataset) collection
+    in a single getInfo() call. Returns {(state, year, dataset): {"size", "latest"}}.
+    Results are kept in the tile cache, so only unseen combinations reach EE.
+    Raises the EE error (quota, auth, timeout) if the call still fails after retries,
+    so it is reported instead of being read as empty collections.
+    """
+    metadata = {}
+    keys = {}
+    for state, year, dataset, geom in items:
+        cached = get_cached(_metadata_recipe(state, year, dataset))
+        if cached is not None:
+            metadata[(state, year, dataset)] = cached
+            continue
+        keys[f"{dataset}|{year}|{state}"] = (state, year, dataset, geom)
+    if not keys:
+        return metadata
+
+    summaries = {}
+    for key, (state, year, dataset, geom) in keys.items():
+        collection = _COLLECTION_BUILDERS[dataset](geom, year)
+        size = collection.size()
+        summaries[key] = ee.Dictionary({
+            "size": size,
+            "latest": ee.Algorithms.If(size.gt(0), collection.aggregate_max("system:time_start"), None),
+        })
+
+    info = None
+    with span("ee.getInfo", kind="collection_metadata", collections=len(keys)) as attributes:
+        for attempt in range(3):
+            attributes["retries"] = attempt
+            try:
+                info = ee.Dictionary(summaries).getInfo()
+                break
+            except Exception as e:
+                if attempt == 2:
+                    logger.error("Failed to resolve collection metadata: %s", e)
+                    raise
+                time.sleep(1)
+
+    for key, (state, year, dataset, _) in keys.items():
+        if key not in info:
+            continue
+        entry = {"size": int(info[key]["size"]), "latest": info[key]["latest"]}
+        put_cached(_metadata_recipe(state, year, dataset), entry)
+        metadata[(state, year, dataset)] = entry
+    return metadata
+
+
+def _resolve_metadata_for(jobs, requested_metrics):
+    datasets = [SENTINEL2]
+    if any(metric in DYNAMIC_WORLD_CLASSES for metric in requested_metrics):
+        datasets.append(DYNAMIC_WORLD)
+    return resolve_collection_metadata(
+        [(state, year, dataset, geom) for state, year, geom in jobs for dataset in datasets]
+    )
+
+
+def _collection_size(metadata, state, year, dataset):
+    return metadata.get((state, year, dataset), {}).get("size", 0)
+
+
+def _mosaic_or_first(collection, size, geom):
+    return collection.mosaic().clip(geom) if size > 1 else collection.first().clip(geom)
+
+
+def _layer_recipe(state, year, dataset, metadata, **extra):
+    recipe = _metadata_recipe(state, year, dataset)
+    recipe.update(kind="layer", source=metadata.get((state, year, dataset)),
+                  clip=get_state_geometry_digest(state, "clip"), **extra)
+    return recipe
+
+
+def _new_map():
+    m = geemap.Map(zoom=7, height=400)
+    # What chat history keeps instead of the rendered HTML, whose EE tile URLs expire (see map_spec)
+    m.layer_specs = []
+    m.center_state = None
+    return m
+
+
+def _add_layer(m, image, vis, name, recipe):
+    m.layer_specs.append({"name": name, "vis": vis, "recipe": recipe})
+    return add_cached_layer(m, image, vis, name, recipe)
+
+
+def _boundary_image(geoms):
+    return ee.FeatureCollection([ee.Feature(geoms["display"])]).style(color="black", width=2, fillColor="00000000")
+
+
+def _sentinel2_image(geoms, year, size):
+    return _mosaic_or_first(_sentinel2_collection(geoms["bbox"], year), size, geoms["clip"])
+
+
+def _land_cover_image(geoms, year):
+    return _dynamic_world_collection(geoms["bbox"], year).mosaic().clip(geoms["clip"]).select("label")
+
+
+def _add_boundary_layer(m, state, geoms):
+    recipe = {"kind": "boundary", "state": state, "geometry": get_state_geometry_digest(state, "display")}
+    _add_layer(m, _boundary_image(geoms), {}, f"{state} Boundary", recipe)
+
+
+def _center_on_state(m, state, geoms):
+    m.center_state = state
+    centroid = get_state_centroid(state)
+    if centroid is None:
+        m.centerObject(geoms["bbox"], 7)
+    else:
+        m.set_center(centroid[0], centroid[1], 7)
+
+
+def _add_legend_once(m, legend, caption, legends, captions):
+    if legend["title"] in legends:
+        return
+    m.add_legend(**legend)
+    captions.append(caption)
+    legends.add(legend["title"])
+
+
+def _add_state_year_layers(m, state, year, geoms, requested_metrics, metadata, legends, captions):
+    """
+    Adds the index and land cover layers of one state-year; returns False without Sentinel-2 data.
+    Collections are filtered by the state's bounding box and the mosaics clipped to its simplified outline.
+    """
+    s2_size = _collection_size(metadata, state, year, SENTINEL2)
+    if s2_size == 0:
+        logger.info("No valid Sentinel-2 data for %s %s", state, year)
+        return False
+
+    s2 = _sentinel2_image(geoms, year, s2_size)
+    index_names = requested_indices(requested_metrics)
+    if index_names:
+        indices = compute_indices(s2, index_names)
+        for name in index_names:
+            spec = SPECTRAL_INDICES[name]
+            recipe = _layer_recipe(state, year, SENTINEL2, metadata, index=name, expression=spec["expression"],
+                                   scale=REFLECTANCE_SCALE)
+            _add_layer(m, indices.select(name), spec["vis"], f"{name} ({state}, {year})", recipe)
+            _add_legend_once(m, spec["legend"], spec["caption"], legends, captions)
+
+    if any(metric in DYNAMIC_WORLD_CLASSES for metric in requested_metrics):
+        if _collection_size(metadata, state, year, DYNAMIC_WORLD) > 0:
+            recipe = _layer_recipe(state, year, DYNAMIC_WORLD, metadata, band="label")
+            _add_layer(m, _land_cover_image(geoms, year), LAND_COVER_VIS, f"Land Cover ({state}, {year})", recipe)
+            _add_legend_once(m, LAND_COVER_LEGEND, LAND_COVER_CAPTION, legends, captions)
+        else:
+            logger.info("No valid Dynamic World data for %s %s", state, year)
+    return True
+
+
+def map_spec(m):
+    """JSON-serializable description of a generated map: its layer recipes, vis params and center."""
+    return {"center": m.center_state, "layers": list(m.layer_specs)}
+
+
+def _layer_image(recipe, geoms):
+    """Rebuilds the EE image of a layer recipe recorded by _add_layer."""
+    if recipe["kind"] == "boundary":
+        return _boundary_image(geoms)
+    if recipe["collection"] == COLLECTION_IDS[DYNAMIC_WORLD]:
+        return _land_cover_image(geoms, recipe["year"])
+    s2 = _sentinel2_image(geoms, recipe["year"], recipe["source"]["size"])
+    return compute_indices(s2, [recipe["index"]]).select(recipe["index"])
+
+
+def build_map(spec):
+    """
+    Rebuilds a map from map_spec() output. Tile URLs come from the tile cache, so EE is
+    only asked again for layers whose URLs have expired. Returns (map, tile URLs).
+    """
+    with span("map.build", layers=len(spec["layers"])):
+        m = _new_map()
+        urls = []
+        legends = set()
+        for layer in spec["layers"]:
+            recipe = layer["recipe"]
+            geoms = get_state_geometries(recipe["state"])
+            if geoms is None:
+                logger.warning("No geometry found for %s", recipe["state"])
+                continue
+            urls.append(_add_layer(m, _layer_image(recipe, geoms), layer["vis"], layer["name"], recipe))
+            if recipe.get("index"):
+                spec_entry = SPECTRAL_INDICES[recipe["index"]]
+                _add_legend_once(m, spec_entry["legend"], spec_entry["caption"], legends, [])
+            elif recipe["kind"] == "layer":
+                _add_legend_once(m, LAND_COVER_LEGEND, LAND_COVER_CAPTION, legends, [])
+        geoms = get_state_geometries(spec["center"]) if spec["center"] else None
+        if geoms is not None:
+            _center_on_state(m, spec["center"], geoms)
+    return m, urls
+
+
+def generate_map(states, year_dict, query, result_queue, requested_metrics=None):
     try:
         shapefile_path = SHAPEFILE_PATH
         if not os.path.exists(shapefile_path):
             result_queue.put((None, f"Shapefile not found at {shapefile_path}", None))
             return
 
-        gdf = gpd.read_file(shapefile_path)
-        gdf["NAME_1"] = gdf["NAME_1"].str.title()
         state_geoms = {}
         for state in states:
             if not state:
-                print("Skipping invalid state: None or empty")
+                logger.warning("Skipping invalid state: None or empty")
                 continue
-            state_gdf = gdf[gdf["NAME_1"] == state]
-            if state_gdf.empty:
-                print(f"No geometry found for {state}")
+            geoms = get_state_geometries(state)
+            if geoms is None:
+                logger.warning("No geometry found for %s", state)
                 continue
-            state_geoms[state] = ee.Geometry(state_gdf.geometry.iloc[0].__geo_interface__)
-
-        m = geemap.Map(zoom=7, height=400)
-        requested_metrics = extract_metrics_from_query(query)
-        captions = []
-        for state, geom in state_geoms.items():
-            boundary = ee.Feature(geom, {"style": {"color": "black", "width": 2}})
-            m.addLayer(boundary, {"style": "outline"}, f"{state} Boundary")
+            state_geoms[state] = geoms
 
+        if requested_metrics is None:
+            requested_metrics = extract_metrics_from_query(query)
+        state_years = {}
+        for state in state_geoms:
             year = year_dict[state][0] if isinstance(year_dict[state], list) else year_dict[state]
             if not year or not isinstance(year, str):
-                print(f"Invalid year for {state}: {year}, using default 2024")
-                year = "2024"
+                logger.warning("Invalid year for %s: %s, using default %s", state, year, MAX_YEAR)
+                year = str(MAX_YEAR)
+            state_years[state] = year
 
-            start_date = f"{year}-01-01"
-            end_date = f"{year}-12-31"
-            s2_collection = None
-            for attempt in range(3):
-                try:
-                    s2_collection = (
-                        ee.ImageCollection("COPERNICUS/S2_HARMONIZED")
-                        .filterBounds(geom)
-                        .filterDate(start_date, end_date)
-                        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
-                        .sort("system:time_start", False)
-                    )
-                    size = s2_collection.size().getInfo()
-                    if size > 0:
-                        break
-                    print(f"Attempt {attempt + 1}: No Sentinel-2 data for {state} {year}")
-                    time.sleep(1)
-                except Exception as e:
-                    if attempt == 2:
-                        print(f"Failed to fetch Sentinel-2 for {state} {year}: {str(e)}")
-                        s2_collection = None
-                        break
-                    time.sleep(1)
-
-            if not s2_collection or s2_collection.size().getInfo() == 0:
-                print(f"No valid Sentinel-2 data for {state} {year}")
-                continue
+        metadata = _resolve_metadata_for(
+            [(state, year, state_geoms[state]["bbox"]) for state, year in state_years.items()], requested_metrics)
 
-            s2 = s2_collection.mosaic().clip(geom) if s2_collection.size().getInfo() > 1 else s2_collection.first().clip(geom)
-            
-            if "NDVI" in requested_metrics:
-                ndvi = s2.normalizedDifference(["B8", "B4"]).rename(f"NDVI_{state}")
-                m.addLayer(ndvi, {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]}, f"NDVI ({state}, {year})")
-            
-            if "NBR" in requested_metrics:
-                nbr = s2.normalizedDifference(["B8", "B12"]).rename(f"NBR_{state}")
-                m.addLayer(nbr, {"min": -1, "max": 1, "palette": ["blue", "white", "red"]}, f"NBR ({state}, {year})")
-            
-            if "EVI" in requested_metrics:
-                nir = s2.select("B8")
-                red = s2.select("B4")
-                blue = s2.select("B2")
-                evi = nir.subtract(red).multiply(2.5).divide(
-                    nir.add(red.multiply(6)).subtract(blue.multiply(7.5)).add(1)
-                ).rename(f"EVI_{state}")
-                m.addLayer(evi, {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]}, f"EVI ({state}, {year})")
-            
-            if "NDMI" in requested_metrics:
-                nir = s2.select("B8")
-                swir1 = s2.select("B11")
-                ndmi = nir.subtract(swir1).divide(nir.add(swir1)).rename(f"NDMI_{state}")
-                m.addLayer(ndmi, {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]}, f"NDMI ({state}, {year})")
-            
-            if "MNDWI" in requested_metrics:
-                green = s2.select("B3")
-                swir1 = s2.select("B11")
-                mndwi = green.subtract(swir1).divide(green.add(swir1)).rename(f"MNDWI_{state}")
-                m.addLayer(mndwi, {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]}, f"MNDWI ({state}, {year})")
-            
-            if any(metric in DYNAMIC_WORLD_CLASSES for metric in requested_metrics):
-                dw_collection = None
-                for attempt in range(3):
-                    try:
-                        dw_collection = (
-                            ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1")
-                            .filterBounds(geom)
-                            .filterDate(start_date, end_date)
-                            .sort("system:time_start", False)
-                        )
-                        size = dw_collection.size().getInfo()
-                        if size > 0:
-                            break
-                        print(f"Attempt {attempt + 1}: No Dynamic World data for {state} {year}")
-                        time.sleep(1)
-                    except Exception as e:
-                        if attempt == 2:
-                            print(f"Failed to fetch Dynamic World for {state} {year}: {str(e)}")
-                            dw_collection = None
-                            break
-                        time.sleep(1)
-
-                if dw_collection and dw_collection.size().getInfo() > 0:
-                    land_cover = dw_collection.mosaic().clip(geom).select("label").rename(f"Land_Cover_{state}")
-                    land_cover_viz = {
-                        "min": 0,
-                        "max": 8,
-                        "palette": ["419BDF", "397D49", "88B053", "7A87C6", "E49635", "DFC35A", "C4281B", "A59B8F", "B39FE1"]
-                    }
-                    m.addLayer(land_cover, land_cover_viz, f"Land Cover ({state}, {year})")
-                    m.add_legend(**LAND_COVER_LEGEND)
-                    captions.append(LAND_COVER_CAPTION)
-                else:
-                    print(f"No valid Dynamic World data for {state} {year}")
+        with span("map.build", states=len(state_geoms), metrics=len(requested_metrics)):
+            m = _new_map()
+            captions = []
+            legends = set()
+            for state, geoms in state_geoms.items():
+                _add_boundary_layer(m, state, geoms)
+                _add_state_year_layers(m, state, state_years[state], geoms, requested_metrics, metadata, legends, captions)
 
         if state_geoms:
-            m.centerObject(next(iter(state_geoms.values())), 7)
+            first_state = next(iter(state_geoms))
+            _center_on_state(m, first_state, state_geoms[first_state])
             result_queue.put((m, None, captions))
         else:
             result_queue.put((None, "No valid state geometries found", None))
@@ -153,148 +298,89 @@ def generate_map(states, year_dict, query, result_queue):
         result_queue.put((None, f"Map generation failed: {str(e)}", None))
 
 
+def _build_comparative_map(state, year, geoms, requested_metrics, metadata):
+    logger.debug("Processing %s %s", state, year)
+    try:
+        with span("map.build", states=1, year=year, metrics=len(requested_metrics)):
+            m = _new_map()
+            captions = []
+            _add_boundary_layer(m, state, geoms)
+
+            if not _add_state_year_layers(m, state, year, geoms, requested_metrics, metadata, set(), captions):
+                return {"state": state, "year": year, "map": None, "captions": [], "error": f"No valid Sentinel-2 data for {state} {year}"}
+            _center_on_state(m, state, geoms)
+        logger.debug("Generated comparative map for %s %s", state, year)
+        return {"state": state, "year": year, "map": m, "captions": captions, "error": None}
+    except Exception as e:
+        logger.error("Comparative map for %s %s failed: %s", state, year, e)
+        return {"state": state, "year": year, "map": None, "captions": [], "error": f"Map generation failed: {str(e)}"}
+
+
 def generate_comparative_maps(states, year_dict, query, requested_metrics, result_queue):
     try:
-        # Log inputs for debugging
-        print(f"Input states: {states}")
-        print(f"Input year_dict: {year_dict}")
+        logger.debug("Input states: %s, year_dict: %s", states, year_dict)
 
         # Pre-validate inputs
         valid_states = [s for s in states if s and isinstance(s, str)]
         if not valid_states:
-            print("No valid states provided")
+            logger.warning("No valid states provided")
             result_queue.put((None, "No valid states provided", None))
             return
 
         cleaned_year_dict = {}
         for state in valid_states:
-            years = year_dict.get(state, ["2024"])
+            years = year_dict.get(state, [str(MAX_YEAR)])
             if not isinstance(years, list):
                 years = [years]
             valid_years = []
             for y in years:
                 try:
                     if y is None or not str(y).strip():
-                        print(f"Skipping invalid year for {state}: {y}")
+                        logger.warning("Skipping invalid year for %s: %s", state, y)
                         continue
                     y_int = int(y)
-                    if 2015 <= y_int <= 2024:
+                    if MIN_YEAR <= y_int <= MAX_YEAR:
                         valid_years.append(str(y_int))
                     else:
-                        print(f"Year {y} out of valid range (2015-2024) for {state}")
+                        logger.warning("Year %s out of valid range (%s-%s) for %s", y, MIN_YEAR, MAX_YEAR, state)
                 except (ValueError, TypeError):
-                    print(f"Invalid year '{y}' for {state}, skipping")
-            cleaned_year_dict[state] = sorted(set(valid_years)) if valid_years else ["2024"]
+                    logger.warning("Invalid year '%s' for %s, skipping", y, state)
+            cleaned_year_dict[state] = sorted(set(valid_years)) if valid_years else [str(MAX_YEAR)]
         
-        print(f"Cleaned year_dict: {cleaned_year_dict}")
+        logger.debug("Cleaned year_dict: %s", cleaned_year_dict)
 
         shapefile_path = SHAPEFILE_PATH
         if not os.path.exists(shapefile_path):
             result_queue.put((None, f"Shapefile not found at {shapefile_path}", None))
             return
 
-        gdf = gpd.read_file(shapefile_path)
-        gdf["NAME_1"] = gdf["NAME_1"].str.title()
         state_geoms = {}
         for state in valid_states:
-            state_gdf = gdf[gdf["NAME_1"] == state]
-            if state_gdf.empty:
-                print(f"No geometry found for {state}")
+            geoms = get_state_geometries(state)
+            if geoms is None:
+                logger.warning("No geometry found for %s", state)
                 continue
-            state_geoms[state] = ee.Geometry(state_gdf.geometry.iloc[0].__geo_interface__)
+            state_geoms[state] = geoms
 
-        comparative_maps = []
-        for state in state_geoms:
-            years = cleaned_year_dict.get(state, ["2024"])
+        jobs = []
+        for state, geoms in state_geoms.items():
+            years = cleaned_year_dict.get(state, [str(MAX_YEAR)])
             if len(years) < 2:
-                print(f"Skipping comparative map for {state}: only {len(years)} year(s) available")
+                logger.info("Skipping comparative map for %s: only %d year(s) available", state, len(years))
                 continue
+            jobs.extend((state, year, geoms) for year in years)
 
-            for year in years:
-                print(f"Processing {state} {year}")
-                if not year or not state:
-                    print(f"Skipping map generation due to invalid state or year: state={state}, year={year}")
-                    continue
-                m = geemap.Map(zoom=7, height=400)
-                captions = []
-                boundary = ee.Feature(state_geoms[state], {"style": {"color": "black", "width": 2}})
-                m.addLayer(boundary, {"style": "outline"}, f"{state} Boundary")
-
-                start_date = f"{year}-01-01"
-                end_date = f"{year}-12-31"
-                s2_collection = None
-                for attempt in range(3):
-                    try:
-                        s2_collection = (
-                            ee.ImageCollection("COPERNICUS/S2_HARMONIZED")
-                            .filterBounds(state_geoms[state])
-                            .filterDate(start_date, end_date)
-                            .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
-                            .sort("system:time_start", False)
-                        )
-                        size = s2_collection.size().getInfo()
-                        if size > 0:
-                            break
-                        print(f"Attempt {attempt + 1}: No Sentinel-2 data for {state} {year}")
-                        time.sleep(1)
-                    except Exception as e:
-                        if attempt == 2:
-                            print(f"Failed to fetch Sentinel-2 for {state} {year}: {str(e)}")
-                            s2_collection = None
-                            break
-                        time.sleep(1)
-
-                if not s2_collection or s2_collection.size().getInfo() == 0:
-                    print(f"No valid Sentinel-2 data for {state} {year}")
-                    continue
-
-                s2 = s2_collection.mosaic().clip(state_geoms[state]) if s2_collection.size().getInfo() > 1 else s2_collection.first().clip(state_geoms[state])
-
-                if "NDVI" in requested_metrics:
-                    ndvi = s2.normalizedDifference(["B8", "B4"]).rename(f"NDVI_{state}_{year}")
-                    m.addLayer(ndvi, {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]}, f"NDVI ({state}, {year})")
-                if "NBR" in requested_metrics:
-                    nbr = s2.normalizedDifference(["B8", "B12"]).rename(f"NBR_{state}_{year}")
-                    m.addLayer(nbr, {"min": -1, "max": 1, "palette": ["blue", "white", "red"]}, f"NBR ({state}, {year})")
-                if "EVI" in requested_metrics:
-                    nir, red, blue = s2.select("B8"), s2.select("B4"), s2.select("B2")
-                    evi = nir.subtract(red).multiply(2.5).divide(nir.add(red.multiply(6)).subtract(blue.multiply(7.5)).add(1)).rename(f"EVI_{state}_{year}")
-                    m.addLayer(evi, {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]}, f"EVI ({state}, {year})")
-                if "NDMI" in requested_metrics:
-                    nir, swir1 = s2.select("B8"), s2.select("B11")
-                    ndmi = nir.subtract(swir1).divide(nir.add(swir1)).rename(f"NDMI_{state}_{year}")
-                    m.addLayer(ndmi, {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]}, f"NDMI ({state}, {year})")
-                if "MNDWI" in requested_metrics:
-                    green, swir1 = s2.select("B3"), s2.select("B11")
-                    mndwi = green.subtract(swir1).divide(green.add(swir1)).rename(f"MNDWI_{state}_{year}")
-                    m.addLayer(mndwi, {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]}, f"MNDWI ({state}, {year})")
-                if any(metric in DYNAMIC_WORLD_CLASSES for metric in requested_metrics):
-                    dw_collection = None
-                    for attempt in range(3):
-                        try:
-                            dw_collection = (ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").filterBounds(state_geoms[state]).filterDate(start_date, end_date).sort("system:time_start", False))
-                            if dw_collection.size().getInfo() > 0: break
-                            print(f"Attempt {attempt + 1}: No Dynamic World data for {state} {year}")
-                            time.sleep(1)
-                        except Exception as e:
-                            if attempt == 2:
-                                print(f"Failed to fetch Dynamic World for {state} {year}: {str(e)}")
-                                dw_collection = None
-                                break
-                            time.sleep(1)
-                    if dw_collection and dw_collection.size().getInfo() > 0:
-                        land_cover = dw_collection.mosaic().clip(state_geoms[state]).select("label").rename(f"Land_Cover_{state}_{year}")
-                        land_cover_viz = {"min": 0, "max": 8, "palette": ["419BDF", "397D49", "88B053", "7A87C6", "E49635", "DFC35A", "C4281B", "A59B8F", "B39FE1"]}
-                        m.addLayer(land_cover, land_cover_viz, f"Land Cover ({state}, {year})")
-                        m.add_legend(**LAND_COVER_LEGEND)
-                        captions.append(LAND_COVER_CAPTION)
-                    else:
-                        print(f"No valid Dynamic World data for {state} {year}")
-                m.centerObject(state_geoms[state], 7)
-                comparative_maps.append({"state": state, "year": year, "map": m, "captions": captions})
-                print(f"Generated comparative map for {state} {year}")
+        metadata = _resolve_metadata_for([(state, year, geoms["bbox"]) for state, year, geoms in jobs], requested_metrics)
+
+        # Each map build is dominated by blocking EE round trips, so a thread pool overlaps them
+        comparative_maps = []
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(MAP_BUILD_WORKERS, len(jobs))) as executor:
+                futures = [executor.submit(_build_comparative_map, state, year, geoms, requested_metrics, metadata)
+                           for state, year, geoms in jobs]
+                comparative_maps = [future.result() for future in futures]
 
-        if comparative_maps:
+        if any(item["map"] for item in comparative_maps):
             result_queue.put((comparative_maps, None, None))
         else:
             result_queue.put((None, "No comparative maps generated: insufficient years or data", None))
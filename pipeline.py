@@ -0,0 +1,117 @@
+# pipeline.py
+"""
+Runs the stages of a query (value extraction, report, visualizations, maps)
+as a dependency graph on a thread pool and publishes each result as soon as
+it is ready.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+from config import MISTRAL_API_KEY, MISTRAL_API_URL, MISTRAL_STRUCTURED_OUTPUT
+from corpus_index import answer_from_index
+from data_processing import generate_report_stream, generate_visualization
+from instrumentation import span
+from llm_services import call_mistral_saba
+from map_generator import generate_comparative_maps, generate_map
+from prompt_builder import build_corpus_context
+from zonal_stats import answer_from_rasters
+
+logger = logging.getLogger(__name__)
+
+_DONE = "_done"
+
+
+def extract_values(query, states, year_dict, requested_metrics):
+    """Returns (mistral_values, corpus_context) from the local index or rasters, falling back to Mistral."""
+    corpus_context, _ = build_corpus_context(states, year_dict, requested_metrics)
+    mistral_values = answer_from_index(states, year_dict, requested_metrics, MISTRAL_STRUCTURED_OUTPUT)
+    if mistral_values is None:
+        mistral_values = answer_from_rasters(states, year_dict, requested_metrics, MISTRAL_STRUCTURED_OUTPUT)
+    if mistral_values is None:
+        mistral_values = call_mistral_saba(MISTRAL_API_URL, MISTRAL_API_KEY, corpus_context, query, states, requested_metrics,
+                                           structured=MISTRAL_STRUCTURED_OUTPUT)
+    logger.debug("Mistral Values: %s", mistral_values)
+    return mistral_values, corpus_context
+
+
+def has_multiple_years(states, year_dict):
+    return any(len(year_dict.get(state, [])) > 1 for state in states)
+
+
+def build_maps(query, states, year_dict, requested_metrics):
+    """Returns (map_data, error, captions, comparative) from the matching map generator."""
+    result_queue = Queue()
+    comparative = has_multiple_years(states, year_dict)
+    if comparative:
+        generate_comparative_maps(states, year_dict, query, requested_metrics, result_queue)
+    else:
+        generate_map(states, year_dict, query, result_queue, requested_metrics)
+    map_data, map_error, map_captions = result_queue.get()
+    return map_data, map_error, map_captions, comparative
+
+
+def run_query_pipeline(plan, max_workers=4):
+    """
+    Runs every stage for a parsed QueryPlan.
+    Generator of (stage, result) events in completion order:
+      ("extraction", mistral_values), ("report_chunk", text), ("report", text),
+      ("visualizations", figures), ("maps", (map_data, error, captions, comparative)),
+      ("error", (stage, message)).
+    Maps start immediately since they only need the parsed states and years;
+    the report and visualizations start once extraction has finished.
+    """
+    query, states, year_dict, requested_metrics = plan.query, plan.state_list, plan.year_dict, plan.metric_list
+    events = Queue()
+
+    def run_stage(name, func):
+        try:
+            with span(f"stage.{name}", states=len(states), years=sum(len(y) for y in year_dict.values())):
+                func()
+        except Exception as e:
+            logger.exception("Stage %s failed", name)
+            events.put(("error", (name, f"{name.capitalize()} failed: {str(e)}")))
+        finally:
+            events.put((_DONE, name))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def maps_stage():
+            events.put(("maps", build_maps(query, states, year_dict, requested_metrics)))
+
+        def report_stage(mistral_values, corpus_context):
+            report = ""
+            for chunk in generate_report_stream(query, states, year_dict, corpus_context, mistral_values):
+                report += chunk
+                events.put(("report_chunk", chunk))
+            events.put(("report", report.strip()))
+
+        def visualizations_stage(mistral_values):
+            events.put(("visualizations", generate_visualization(mistral_values, states, year_dict, query, requested_metrics)))
+
+        def extraction_stage():
+            events.put(("extraction", extract_values(query, states, year_dict, requested_metrics)))
+
+        pending = 2
+        executor.submit(run_stage, "maps", maps_stage)
+        executor.submit(run_stage, "extraction", extraction_stage)
+
+        # This loop is the scheduler: dependents are submitted here, on receipt of
+        # the extraction result and before its done marker, so `pending` only
+        # changes on this thread.
+        while pending:
+            stage, result = events.get()
+            if stage == _DONE:
+                pending -= 1
+                continue
+            if stage == "extraction":
+                mistral_values, corpus_context = result
+                if "API Error" in mistral_values:
+                    yield stage, mistral_values
+                    yield "error", ("extraction", mistral_values)
+                    continue
+                pending += 2
+                executor.submit(run_stage, "report", lambda: report_stage(mistral_values, corpus_context))
+                executor.submit(run_stage, "visualizations", lambda: visualizations_stage(mistral_values))
+                yield stage, mistral_values
+                continue
+            yield stage, result
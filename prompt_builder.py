@@ -0,0 +1,123 @@
+# prompt_builder.py
+"""
+Builds LLM context from only the corpus lines relevant to a query (by state,
+year section and metric), within a configurable token budget.
+"""
+import logging
+import re
+import threading
+
+from config import MAX_YEAR, PROMPT_TOKEN_BUDGET
+from corpus_index import CANONICAL_METRICS, METRIC_ALTERNATION, YEAR_PATTERN
+from corpus_store import get_corpus, get_state_corpus
+from instrumentation import increment, span
+
+logger = logging.getLogger(__name__)
+
+_METRIC_PATTERN = re.compile(r"\b(" + METRIC_ALTERNATION + r")\b", re.IGNORECASE)
+
+_lock = threading.Lock()
+_sections_by_state = {}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English and numbers)."""
+    return (len(text) + 3) // 4
+
+
+def _index_lines(text):
+    """Returns [(section_year, metrics, line)], where section_year is the year heading the line belongs to."""
+    indexed = []
+    current_year = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        year_match = YEAR_PATTERN.search(line)
+        if year_match:
+            current_year = year_match.group(1)
+        metrics = frozenset(CANONICAL_METRICS[m.lower()] for m in _METRIC_PATTERN.findall(line))
+        indexed.append((current_year, metrics, line))
+    return indexed
+
+
+def _state_lines(state):
+    entry = get_state_corpus(state)
+    if entry is None:
+        return None
+    text, signature = entry
+    with _lock:
+        cached = _sections_by_state.get(state)
+        if cached and cached[0] == signature:
+            return cached[1]
+    indexed = (_index_lines(text), estimate_tokens(f"\n--- {state} ---\n" + text))
+    with _lock:
+        _sections_by_state[state] = (signature, indexed)
+    return indexed
+
+
+def _line_priority(section_year, metrics, years, requested_metrics):
+    if section_year is not None and section_year not in years:
+        return None
+    if metrics and not metrics & requested_metrics:
+        return None
+    if section_year is None:
+        return 0
+    return 2 if metrics else 1
+
+
+def _sliced_context(states, year_dict, metrics, budget):
+    requested_metrics = frozenset(metrics or [])
+    candidates = []
+    full_tokens = 0
+    for state_order, state in enumerate(states):
+        indexed = _state_lines(state)
+        if indexed is None:
+            continue
+        lines, state_tokens = indexed
+        full_tokens += state_tokens
+        years = set(str(y) for y in year_dict.get(state, [str(MAX_YEAR)]))
+        for line_order, (section_year, line_metrics, line) in enumerate(lines):
+            priority = _line_priority(section_year, line_metrics, years, requested_metrics)
+            if priority is not None:
+                candidates.append((priority, state_order, line_order, state, line))
+
+    remaining = budget - sum(estimate_tokens(f"\n--- {state} ---\n") for state in states)
+    selected = []
+    for candidate in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        cost = estimate_tokens(candidate[4]) + 1
+        if cost > remaining:
+            continue
+        selected.append(candidate)
+        remaining -= cost
+
+    lines_by_state = {}
+    for _, _, _, state, line in sorted(selected, key=lambda c: (c[1], c[2])):
+        lines_by_state.setdefault(state, []).append(line)
+    context = "".join(f"\n--- {state} ---\n" + "\n".join(lines_by_state.get(state, [])) for state in states)
+
+    used_tokens = estimate_tokens(context)
+    stats = {"full_tokens": full_tokens, "used_tokens": used_tokens, "saved_tokens": max(0, full_tokens - used_tokens)}
+    logger.debug("Prompt context for %s: %d tokens (saved %d of %d)", ", ".join(states), used_tokens,
+                 stats["saved_tokens"], full_tokens)
+    return context, stats
+
+
+def build_corpus_context(states, year_dict, metrics, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Returns (context, stats). The context holds, per state, the corpus lines in the
+    requested year sections that mention a requested metric (or no metric at all),
+    most relevant first until the token budget is spent, in original order.
+    A budget of 0 (or None) disables slicing and returns the full corpus.
+    The stats are recorded on a "prompt.context" span and as token counters.
+    """
+    with span("prompt.context", states=len(states), budget=budget or 0) as attributes:
+        if budget:
+            context, stats = _sliced_context(states, year_dict, metrics, budget)
+        else:
+            context = get_corpus(states)
+            tokens = estimate_tokens(context)
+            stats = {"full_tokens": tokens, "used_tokens": tokens, "saved_tokens": 0}
+        attributes.update(stats)
+    increment("prompt_context_tokens", stats["used_tokens"])
+    increment("prompt_saved_tokens", stats["saved_tokens"])
+    return context, stats
@@ -0,0 +1,207 @@
+# query_parser.py
+"""
+Single-pass query parser. States and metric keywords are matched with one
+precompiled alternation each, coordinates, bounding boxes and district names
+are resolved to states through the spatial index, and the result is an
+immutable, memoized QueryPlan that is passed through the pipeline instead of
+re-parsing.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from config import MAX_YEAR, MIN_YEAR, state_corpus_files, DYNAMIC_WORLD_CLASSES
+from instrumentation import span
+from spatial_index import get_spatial_index, has_districts
+from spectral_indices import SPECTRAL_INDICES
+
+logger = logging.getLogger(__name__)
+
+_STATE_NAMES = {state.lower(): state for state in state_corpus_files}
+# Longest names first so no state is shadowed by a shorter one sharing a prefix
+_STATE_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(s) for s in sorted(state_corpus_files, key=len, reverse=True)) + r")\b"
+    r"(?:\s*(\d{4})\b)?",
+    re.IGNORECASE,
+)
+_INDEX_KEYWORDS = [name.lower() for name in SPECTRAL_INDICES]
+# Lookahead so overlapping keywords (e.g. inside longer words) are all reported, like substring checks
+_METRIC_PATTERN = re.compile(r"(?=(" + "|".join(_INDEX_KEYWORDS + ["land cover"]) + r"))")
+_LAST_N_YEARS_PATTERN = re.compile(r"last\s+(\d+)\s+years?", re.IGNORECASE)
+_RANGE_PATTERN = re.compile(r"(\d{4})\s*(?:to|-)\s*(\d{4})", re.IGNORECASE)
+_YEAR_PATTERN = re.compile(r"\b(\d{4})\b")
+_NUMBER = r"(-?\d+(?:\.\d+)?)"
+# "bbox 76.2, 8.3, 77.4, 12.8" as min_lon, min_lat, max_lon, max_lat (GeoJSON order)
+_BBOX_PATTERN = re.compile(
+    r"\b(?:bbox|bounding\s+box)\s*[:=]?\s*[\[(]?\s*" + r"\s*,\s*".join([_NUMBER] * 4) + r"\s*[\])]?",
+    re.IGNORECASE,
+)
+# "at 10.85, 76.27", "10.85°, 76.27°" or "10.85N 76.27E" as latitude, longitude; decimals are required so
+# years never match. Hemisphere letters are case-sensitive and must end a word, so "83.3 with" is not 83.3 W
+_COORDINATE_PATTERN = re.compile(
+    r"(?:\b((?i:at|near|around))\s+)?(?<![\d.])(-?\d{1,2}\.\d+)\s*(°)?\s*(?:([NS])\b)?\s*[,\s]\s*"
+    r"(-?\d{1,3}\.\d+)\s*(°)?\s*(?:([EW])\b)?(?![\d.])"
+)
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    query: str
+    states: tuple
+    years: tuple
+    metrics: tuple
+    compare: bool
+    land_cover: bool
+    # (kind, label, states) for each coordinate, bounding box or district resolved to states
+    locations: tuple = ()
+
+    @property
+    def year_dict(self):
+        """Fresh {state: [years]} dict in the shape extract_year has always returned."""
+        return {state: list(years) for state, years in self.years}
+
+    @property
+    def state_list(self):
+        return list(self.states)
+
+    @property
+    def metric_list(self):
+        return list(self.metrics)
+
+
+def _parse_states(query):
+    states = set()
+    state_years = {}
+    for match in _STATE_PATTERN.finditer(query):
+        state = _STATE_NAMES[match.group(1).lower()]
+        if state not in states:
+            states.add(state)
+            state_years[state] = match.group(2)
+    return [state for state in state_corpus_files if state in states], state_years
+
+
+def _parse_locations(query):
+    """
+    Resolves bounding boxes, coordinates and district names to states.
+    Returns ([(kind, label, states)], query with the matched text blanked out).
+    """
+    matches = []
+    remaining = query
+    for match in _BBOX_PATTERN.finditer(remaining):
+        min_lon, min_lat, max_lon, max_lat = map(float, match.groups())
+        matches.append(("bbox", match.group(0).strip(), (min(min_lon, max_lon), min(min_lat, max_lat),
+                                                           max(min_lon, max_lon), max(min_lat, max_lat))))
+    remaining = _BBOX_PATTERN.sub(" ", remaining)
+    parts = []
+    end = 0
+    for match in _COORDINATE_PATTERN.finditer(remaining):
+        cue, lat, lat_degrees, lat_hemisphere, lon, lon_degrees, lon_hemisphere = match.groups()
+        # A bare decimal pair ("NDVI above 0.4, 0.6") is not a coordinate
+        if not (cue or lat_degrees or lon_degrees or lat_hemisphere or lon_hemisphere):
+            continue
+        lat = -float(lat) if lat_hemisphere == "S" else float(lat)
+        lon = -float(lon) if lon_hemisphere == "W" else float(lon)
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            matches.append(("point", match.group(0)[match.start(2) - match.start():].strip(), (lon, lat)))
+            parts.append(remaining[end:match.start()] + " ")
+            end = match.end()
+    remaining = "".join(parts) + remaining[end:]
+    if not matches and not has_districts():
+        return [], remaining
+
+    try:
+        index = get_spatial_index()
+    except Exception as e:
+        logger.warning("Spatial index unavailable: %s", e)
+        return [], remaining
+    if index is None:
+        return [], remaining
+
+    locations = []
+    for kind, label, value in matches:
+        states = index.states_in_bbox(*value) if kind == "bbox" else index.states_at(*value)
+        locations.append((kind, label, tuple(states)))
+    if index.district_pattern is not None:
+        # A district inside a state name ("West" in "West Bengal") is part of that name, not a district
+        state_spans = [match.span(1) for match in _STATE_PATTERN.finditer(remaining)]
+        parts = []
+        end = 0
+        for match in index.district_pattern.finditer(remaining):
+            if any(start < match.end() and match.start() < stop for start, stop in state_spans):
+                continue
+            locations.append(("district", match.group(0), tuple(index.district_states_for(match.group(0)))))
+            parts.append(remaining[end:match.start()] + " ")
+            end = match.end()
+        remaining = "".join(parts) + remaining[end:]
+    return locations, remaining
+
+
+def _parse_years(query, states, state_years):
+    if not states:
+        states = ["default"]
+        default_match = re.search(r"\bdefault\s*(\d{4})?\b", query, re.IGNORECASE)
+        state_years = {"default": default_match.group(1) if default_match else None}
+    year_dict = {state: [] for state in states}
+
+    last_n_years_match = _LAST_N_YEARS_PATTERN.search(query)
+    if last_n_years_match:
+        start_year = max(MIN_YEAR, MAX_YEAR - int(last_n_years_match.group(1)) + 1)
+        return {state: [str(y) for y in range(start_year, MAX_YEAR + 1)] for state in states}
+
+    range_match = _RANGE_PATTERN.search(query)
+    if range_match:
+        start_year, end_year = map(int, range_match.groups())
+        start_year = max(MIN_YEAR, start_year)
+        end_year = min(MAX_YEAR, end_year)
+        if start_year <= end_year:
+            for state in states:
+                year_dict[state] = [str(y) for y in range(start_year, end_year + 1)]
+    else:
+        valid_years = [y for y in _YEAR_PATTERN.findall(query) if MIN_YEAR <= int(y) <= MAX_YEAR]
+        if valid_years:
+            for state in states:
+                year_dict[state] = sorted(set(valid_years))
+
+    for state in states:
+        state_year = state_years.get(state)
+        if state_year and not year_dict[state]:
+            year_dict[state] = [state_year] if MIN_YEAR <= int(state_year) <= MAX_YEAR else []
+        if not year_dict[state]:
+            year_dict[state] = [str(MAX_YEAR)]
+    return year_dict
+
+
+def _parse_metrics(query_lower):
+    if "land cover" in query_lower:
+        return list(DYNAMIC_WORLD_CLASSES)
+    found = set(_METRIC_PATTERN.findall(query_lower))
+    # A single index is honoured only when it is the only one mentioned
+    if len(found) == 1:
+        return [found.pop().upper()]
+    return ["NDVI"]
+
+
+@lru_cache(maxsize=1024)
+def parse_query(query):
+    """Parses states, years per state, metrics and flags from a query in one pass per concern."""
+    with span("query.parse") as attributes:
+        query_lower = query.lower()
+        locations, remaining = _parse_locations(query)
+        states, state_years = _parse_states(remaining)
+        if locations:
+            located = {state for _, _, location_states in locations for state in location_states}
+            states = [state for state in state_corpus_files if state in located or state in states]
+        year_dict = _parse_years(remaining, states, state_years)
+        plan = QueryPlan(
+            query=query,
+            states=tuple(states),
+            years=tuple((state, tuple(years)) for state, years in year_dict.items()),
+            metrics=tuple(_parse_metrics(query_lower)),
+            compare="compare" in query_lower,
+            land_cover="land cover" in query_lower,
+            locations=tuple(locations),
+        )
+        attributes.update(states=len(plan.states), years=sum(len(years) for _, years in plan.years),
+                          metrics=len(plan.metrics), locations=len(plan.locations))
+        return plan
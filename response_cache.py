@@ -0,0 +1,103 @@
+# response_cache.py
+"""
+Two-tier (in-memory LRU + SQLite) cache for LLM responses. Keys are content
+addressed, so a changed corpus file produces new keys and stale answers are
+never served.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import (RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MEMORY_ENTRIES,
+                    RESPONSE_CACHE_MAX_BYTES)
+from disk_cache import DiskCache, cache_key
+
+
+def corpus_digest(corpus):
+    return hashlib.sha256(corpus.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_entries, ttl, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Optional bound on the summed sizes passed to set(); the least recently used entries go first
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created, _ = entry
+            if time.time() - created > self.ttl:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size=0):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, time.time(), size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._pop(next(iter(self._entries)))
+
+
+class ResponseCache:
+    def __init__(self, memory_entries, path, ttl, max_bytes):
+        self.memory = LRUCache(memory_entries, ttl)
+        self.disk = DiskCache(path, ttl, max_bytes=max_bytes)
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self._count("disk_hits")
+            self.memory.set(key, value)
+            return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+mistral_cache = ResponseCache(RESPONSE_CACHE_MEMORY_ENTRIES, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL,
+                              RESPONSE_CACHE_MAX_BYTES)
+
+
+def mistral_cache_key(model, system_prompt, corpus, query, states, metrics):
+    return cache_key({
+        "model": model,
+        "system": system_prompt,
+        "corpus": corpus_digest(corpus),
+        "query": query,
+        "states": list(states),
+        "metrics": list(metrics) if metrics else None,
+    })
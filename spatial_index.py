@@ -0,0 +1,159 @@
+# spatial_index.py
+"""
+STRtree index over the GADM level-1 (state) polygons, plus the level-2
+(district) names from SHAPEFILE_L2_PATH when it exists. It resolves
+coordinates, bounding boxes and district names to the states in
+state_corpus_files; a district resolves to its whole state, as the corpus,
+rasters and maps are per state. The index is built once, persisted to
+SPATIAL_INDEX_PATH as JSON (geometries as WKB), and rebuilt only when a
+shapefile changes. State geometries
+are simplified at GEOMETRY_CLIP_TOLERANCE and prepared, so a lookup is a tree
+query plus a few prepared predicates.
+"""
+import logging
+import json
+import os
+import re
+import threading
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import Point, box
+
+from config import (GEOMETRY_CLIP_TOLERANCE, SHAPEFILE_L2_PATH, SHAPEFILE_PATH, SPATIAL_INDEX_PATH,
+                    state_corpus_files)
+from disk_cache import file_signature
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 3
+# District names that are also everyday words in queries are not matched by name
+GENERIC_DISTRICT_NAMES = {"north", "south", "east", "west", "central", "north east", "north west", "south east",
+                          "south west", "new", "city"}
+
+_lock = threading.Lock()
+_index = None
+
+
+def _read_states(path):
+    gdf = gpd.read_file(path, columns=["NAME_1"])
+    gdf = gdf[gdf.geometry.notna()]
+    geometries = shapely.simplify(gdf.geometry.values, GEOMETRY_CLIP_TOLERANCE, preserve_topology=True)
+    return gdf["NAME_1"].str.title().tolist(), geometries
+
+
+def _read_districts(path):
+    # Only the names are used, so the level-2 polygons are not read
+    df = gpd.read_file(path, columns=["NAME_1", "NAME_2"], ignore_geometry=True)
+    return df["NAME_2"].str.title().tolist(), df["NAME_1"].str.title().tolist()
+
+
+class SpatialIndex:
+    def __init__(self, state_names, state_geometries, district_names=(), district_states=()):
+        self.state_names = list(state_names)
+        self.district_names = list(district_names)
+        self.district_states = list(district_states)
+        self._state_geometries = np.asarray(state_geometries, dtype=object)
+        self._state_tree = shapely.STRtree(self._state_geometries)
+        shapely.prepare(self._state_geometries)
+        self._districts_by_name = {}
+        for i, name in enumerate(self.district_names):
+            self._districts_by_name.setdefault(name.lower(), []).append(i)
+        self.district_pattern = None
+        excluded = GENERIC_DISTRICT_NAMES | {state.lower() for state in state_corpus_files}
+        names = [name for name in self._districts_by_name if name not in excluded]
+        if names:
+            self.district_pattern = re.compile(
+                r"\b(" + "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+
+    def to_dict(self):
+        """JSON-serializable form, with the state geometries as WKB hex; the tree is rebuilt on load."""
+        return {"state_names": self.state_names,
+                "state_geometries": shapely.to_wkb(self._state_geometries, hex=True).tolist(),
+                "district_names": self.district_names, "district_states": self.district_states}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["state_names"], shapely.from_wkb(data["state_geometries"]), data["district_names"],
+                   data["district_states"])
+
+    def _supported(self, names):
+        names = set(names)
+        return [state for state in state_corpus_files if state in names]
+
+    def states_at(self, lon, lat):
+        """States (in state_corpus_files) containing the point."""
+        # Bounding boxes from the tree, then the exact test against the prepared polygons
+        candidates = self._state_tree.query(Point(lon, lat))
+        hits = candidates[shapely.intersects_xy(self._state_geometries[candidates], lon, lat)]
+        return self._supported(self.state_names[i] for i in hits)
+
+    def states_in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """States (in state_corpus_files) intersecting the box."""
+        query = box(min_lon, min_lat, max_lon, max_lat)
+        candidates = self._state_tree.query(query)
+        hits = candidates[shapely.intersects(self._state_geometries[candidates], query)]
+        return self._supported(self.state_names[i] for i in hits)
+
+    def district_states_for(self, name):
+        """States containing districts called `name` (several states can share a district name)."""
+        return self._supported(self.district_states[i] for i in self._districts_by_name.get(name.lower(), []))
+
+
+def _build():
+    with span("spatial_index.build", l2=os.path.exists(SHAPEFILE_L2_PATH)):
+        state_names, state_geometries = _read_states(SHAPEFILE_PATH)
+        district_names, district_states = [], []
+        if os.path.exists(SHAPEFILE_L2_PATH):
+            district_names, district_states = _read_districts(SHAPEFILE_L2_PATH)
+        return SpatialIndex(state_names, state_geometries, district_names, district_states)
+
+
+def _load_persisted(signature):
+    if not os.path.exists(SPATIAL_INDEX_PATH):
+        return None
+    try:
+        with open(SPATIAL_INDEX_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION or data.get("signature") != signature:
+            return None
+        return SpatialIndex.from_dict(data["index"])
+    except (OSError, ValueError, KeyError, TypeError, shapely.errors.GEOSException) as e:
+        logger.warning("Ignoring unreadable spatial index %s: %s", SPATIAL_INDEX_PATH, e)
+        return None
+
+
+def _persist(index, signature):
+    os.makedirs(os.path.dirname(SPATIAL_INDEX_PATH), exist_ok=True)
+    tmp_path = SPATIAL_INDEX_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "signature": signature, "index": index.to_dict()}, f)
+    os.replace(tmp_path, SPATIAL_INDEX_PATH)
+
+
+def get_spatial_index():
+    """Returns the SpatialIndex for the current shapefiles, loading or rebuilding it as needed (None without a shapefile)."""
+    global _index
+    signature = [file_signature(SHAPEFILE_PATH), file_signature(SHAPEFILE_L2_PATH)]
+    if signature[0] is None:
+        return None
+    with _lock:
+        if _index is not None and _index[0] == signature:
+            return _index[1]
+        index = _load_persisted(signature)
+        if index is None:
+            index = _build()
+            try:
+                _persist(index, signature)
+            except OSError as e:
+                logger.warning("Failed to persist spatial index: %s", e)
+            logger.info("Built spatial index: %d states, %d districts", len(index.state_names),
+                        len(index.district_names))
+        _index = (signature, index)
+        return index
+
+
+def has_districts():
+    return os.path.exists(SHAPEFILE_L2_PATH)
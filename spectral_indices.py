@@ -0,0 +1,106 @@
+# spectral_indices.py
+"""
+Registry of Sentinel-2 spectral index definitions (band formula, visualization
+parameters, legend) and helpers that compute the requested indices of a
+composite as one multi-band image, or evaluate an index on local band arrays.
+"""
+import ast
+import operator
+
+import ee
+
+from config import (NDVI_LEGEND, NDVI_CAPTION, EVI_LEGEND, EVI_CAPTION, NBR_LEGEND, NBR_CAPTION,
+                    NDMI_LEGEND, NDMI_CAPTION, MNDWI_LEGEND, MNDWI_CAPTION)
+
+# Band aliases used in the expressions below
+SENTINEL2_BANDS = {"BLUE": "B2", "GREEN": "B3", "RED": "B4", "NIR": "B8", "SWIR1": "B11", "SWIR2": "B12"}
+# Sentinel-2 digital numbers per unit of surface reflectance
+REFLECTANCE_SCALE = 10000.0
+
+SPECTRAL_INDICES = {
+    "NDVI": {
+        "expression": "(NIR - RED) / (NIR + RED)",
+        "vis": {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]},
+        "legend": NDVI_LEGEND,
+        "caption": NDVI_CAPTION,
+    },
+    "NBR": {
+        "expression": "(NIR - SWIR2) / (NIR + SWIR2)",
+        "vis": {"min": -1, "max": 1, "palette": ["red", "white", "blue"]},
+        "legend": NBR_LEGEND,
+        "caption": NBR_CAPTION,
+    },
+    "EVI": {
+        "expression": "2.5 * (NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1)",
+        "vis": {"min": 0, "max": 1, "palette": ["red", "yellow", "green"]},
+        "legend": EVI_LEGEND,
+        "caption": EVI_CAPTION,
+    },
+    "NDMI": {
+        "expression": "(NIR - SWIR1) / (NIR + SWIR1)",
+        "vis": {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]},
+        "legend": NDMI_LEGEND,
+        "caption": NDMI_CAPTION,
+    },
+    "MNDWI": {
+        "expression": "(GREEN - SWIR1) / (GREEN + SWIR1)",
+        "vis": {"min": -1, "max": 1, "palette": ["brown", "white", "blue"]},
+        "legend": MNDWI_LEGEND,
+        "caption": MNDWI_CAPTION,
+    },
+}
+
+
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+def _compile_expression(expression):
+    """
+    Turns an index expression into a function of a {band alias: value} mapping.
+    Only numbers, band aliases, unary minus and + - * / are accepted, so the
+    expressions stay plain band math that evaluates the same on NumPy arrays
+    as in Earth Engine.
+    """
+    def build(node):
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            op, left, right = _OPERATORS[type(node.op)], build(node.left), build(node.right)
+            return lambda bands: op(left(bands), right(bands))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = build(node.operand)
+            return lambda bands: -operand(bands)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return lambda bands: node.value
+        if isinstance(node, ast.Name) and node.id in SENTINEL2_BANDS:
+            return lambda bands: bands[node.id]
+        raise ValueError(f"Unsupported syntax in index expression {expression!r}: {ast.dump(node)}")
+
+    return build(ast.parse(expression, mode="eval").body)
+
+
+_EVALUATORS = {name: _compile_expression(definition["expression"]) for name, definition in SPECTRAL_INDICES.items()}
+
+
+def evaluate_index(name, bands):
+    """Evaluates index `name` on a {band alias: reflectance} mapping of NumPy arrays (or numbers)."""
+    return _EVALUATORS[name](bands)
+
+
+def requested_indices(metrics):
+    return [metric for metric in metrics if metric in SPECTRAL_INDICES]
+
+
+def compute_indices(image, index_names):
+    """
+    Returns one image with a band per requested index, named after the index.
+    The source bands are selected, cast to float and scaled from digital numbers
+    to reflectance once and shared by every expression, so the server-side graph
+    holds a single band selection and every caller (maps, corpus builder) sees the
+    reflectance values the expressions' constants assume.
+    """
+    bands = (image.select(list(SENTINEL2_BANDS.values()), list(SENTINEL2_BANDS.keys()))
+             .toFloat().divide(REFLECTANCE_SCALE))
+    band_map = {alias: bands.select(alias) for alias in SENTINEL2_BANDS}
+    return ee.Image.cat([
+        bands.expression(SPECTRAL_INDICES[name]["expression"], band_map).rename(name)
+        for name in index_names
+    ])
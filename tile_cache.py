@@ -0,0 +1,54 @@
+# tile_cache.py
+"""
+Persistent cache of Earth Engine tile URL templates, keyed by a hash of the
+recipe that produced the image, so repeated views skip getMapId().
+"""
+import threading
+
+from config import TILE_CACHE_PATH, TILE_CACHE_TTL
+from disk_cache import DiskCache, cache_key
+from instrumentation import span
+
+_cache = DiskCache(TILE_CACHE_PATH, TILE_CACHE_TTL)
+_inflight_lock = threading.Lock()
+_inflight = {}
+
+
+def get_cached(recipe):
+    return _cache.get(cache_key(recipe))
+
+
+def put_cached(recipe, value):
+    _cache.set(cache_key(recipe), value)
+
+
+def get_tile_url(image, vis, recipe):
+    """
+    Returns the tile URL template for an image, asking EE only when the recipe is not
+    cached. Concurrent callers with the same recipe (e.g. one boundary layer on several
+    comparative maps) share a single getMapId() call.
+    """
+    key = cache_key({"recipe": recipe, "vis": vis})
+    url = _cache.get(key)
+    if url is not None:
+        return url
+    with _inflight_lock:
+        key_lock = _inflight.setdefault(key, threading.Lock())
+    try:
+        with key_lock:
+            url = _cache.get(key)
+            if url is None:
+                with span("ee.getMapId", kind=recipe.get("kind"), state=recipe.get("state"), year=recipe.get("year")):
+                    url = image.getMapId(vis)["tile_fetcher"].url_format
+                _cache.set(key, url)
+            return url
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def add_cached_layer(m, image, vis, name, recipe):
+    """Adds an EE image to a geemap map through the tile URL cache; returns the tile URL."""
+    url = get_tile_url(image, vis, recipe)
+    m.add_tile_layer(url, name=name, attribution="Google Earth Engine")
+    return url
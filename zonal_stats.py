@@ -0,0 +1,221 @@
+# zonal_stats.py
+"""
+Offline zonal statistics over local rasters. Per-state mean spectral indices
+and Dynamic World class fractions are computed from yearly GeoTIFF/COG files
+under RASTER_FOLDER:
+
+    RASTER_FOLDER/<year>/sentinel2.tif     bands B2, B3, B4, B8, B11, B12 (reflectance x 10000)
+    RASTER_FOLDER/<year>/dynamicworld.tif  one band of Dynamic World labels (0-8)
+
+Rasters are read in windows, on a process pool when there are enough tiles to
+pay for it; each tile rasterizes the state polygons and reduces the band math to per-state sums with np.bincount. Results
+are cached per (raster, shapefile, state), so repeated queries are dictionary
+lookups and numbers never depend on an external API.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+from shapely.geometry import shape
+
+from config import (DYNAMIC_WORLD_CLASSES, MAX_YEAR, RASTER_FOLDER, SHAPEFILE_PATH, ZONAL_STATS_CACHE_PATH,
+                    ZONAL_STATS_TILE_SIZE, ZONAL_STATS_WORKERS)
+from corpus_index import format_values
+from disk_cache import DiskCache, cache_key, file_signature
+from extraction import format_records
+from geometry_store import get_state_geojson
+from instrumentation import span
+from spectral_indices import REFLECTANCE_SCALE, SENTINEL2_BANDS, SPECTRAL_INDICES, evaluate_index
+
+logger = logging.getLogger(__name__)
+
+SENTINEL2_RASTER = "sentinel2.tif"
+DYNAMIC_WORLD_RASTER = "dynamicworld.tif"
+# Below this many tiles per worker, pickling shapes and partial sums costs more than the pool saves
+MIN_TILES_PER_WORKER = 4
+
+_cache = DiskCache(ZONAL_STATS_CACHE_PATH, ttl=365 * 24 * 3600)
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def raster_path(year, name):
+    return os.path.join(RASTER_FOLDER, str(year), name)
+
+
+def _tile_windows(width, height, bounds_px, tile_size):
+    """Yields (col_off, row_off, width, height) tiles covering the pixel bounds (col0, row0, col1, row1)."""
+    col0, row0, col1, row1 = bounds_px
+    for row in range(max(row0, 0), min(row1, height), tile_size):
+        for col in range(max(col0, 0), min(col1, width), tile_size):
+            yield col, row, min(tile_size, width - col, col1 - col), min(tile_size, height - row, row1 - row)
+
+
+def _spectral_tile(src, window, zones, n_zones):
+    """Returns {metric: (sums, counts)} per zone for one Sentinel-2 tile."""
+    data = src.read(window=window, masked=True).astype("float32") / REFLECTANCE_SCALE
+    bands = {alias: data[i].filled(np.nan) for i, alias in enumerate(SENTINEL2_BANDS)}
+    results = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for metric in SPECTRAL_INDICES:
+            index = evaluate_index(metric, bands)
+            valid = (zones > 0) & np.isfinite(index)
+            z = zones[valid]
+            results[metric] = (np.bincount(z, weights=index[valid], minlength=n_zones + 1),
+                               np.bincount(z, minlength=n_zones + 1))
+    return results
+
+
+def _land_cover_tile(src, window, zones, n_zones):
+    """Returns a (zones + 1) x classes array of pixel counts for one Dynamic World tile."""
+    labels = src.read(1, window=window, masked=True)
+    valid = (zones > 0) & ~np.ma.getmaskarray(labels) & (labels.data < len(DYNAMIC_WORLD_CLASSES))
+    cells = zones[valid].astype(np.int64) * len(DYNAMIC_WORLD_CLASSES) + labels.data[valid].astype(np.int64)
+    return np.bincount(cells, minlength=(n_zones + 1) * len(DYNAMIC_WORLD_CLASSES)).reshape(n_zones + 1, -1)
+
+
+def _tile_stats(path, kind, tile, shapes):
+    """Worker: reduces one raster tile to per-zone partial sums. `shapes` are (geojson, zone) in the raster CRS."""
+    window = Window(*tile)
+    with rasterio.open(path) as src:
+        zones = rasterize(shapes, out_shape=(tile[3], tile[2]), transform=src.window_transform(window),
+                          fill=0, dtype="int32")
+        if not zones.any():
+            return None
+        if kind == "spectral":
+            return _spectral_tile(src, window, zones, len(shapes))
+        return _land_cover_tile(src, window, zones, len(shapes))
+
+
+def _get_pool():
+    """Returns the process pool shared by every computation, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: forking from the app's threads can copy locks held by other threads
+            _pool = ProcessPoolExecutor(max_workers=ZONAL_STATS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _compute(path, kind, states):
+    """Returns {state: {metric: value}} for the given states, reading only the tiles their polygons touch."""
+    with rasterio.open(path) as src:
+        shapes = []
+        zone_states = []
+        col0 = row0 = float("inf")
+        col1 = row1 = 0
+        for state in states:
+            geojson = get_state_geojson(state)
+            if geojson is None:
+                continue
+            if src.crs and src.crs.to_string() != "EPSG:4326":
+                geojson = transform_geom("EPSG:4326", src.crs, geojson)
+            zone_states.append(state)
+            shapes.append((geojson, len(zone_states)))
+            minx, miny, maxx, maxy = shape(geojson).bounds
+            r_top, c_left = src.index(minx, maxy)
+            r_bottom, c_right = src.index(maxx, miny)
+            col0, row0 = min(col0, c_left), min(row0, r_top)
+            col1, row1 = max(col1, c_right + 1), max(row1, r_bottom + 1)
+        if not shapes:
+            return {}
+        tiles = list(_tile_windows(src.width, src.height, (int(col0), int(row0), col1, row1), ZONAL_STATS_TILE_SIZE))
+
+    n_zones = len(shapes)
+    parallel = ZONAL_STATS_WORKERS > 1 and len(tiles) >= ZONAL_STATS_WORKERS * MIN_TILES_PER_WORKER
+    with span("zonal.compute", kind=kind, states=n_zones, tiles=len(tiles), parallel=parallel):
+        if parallel:
+            partials = list(_get_pool().map(_tile_stats, [path] * len(tiles), [kind] * len(tiles), tiles,
+                                            [shapes] * len(tiles)))
+        else:
+            partials = [_tile_stats(path, kind, tile, shapes) for tile in tiles]
+    partials = [p for p in partials if p is not None]
+
+    results = {state: {} for state in zone_states}
+    if kind == "spectral":
+        for metric in SPECTRAL_INDICES:
+            sums = sum((p[metric][0] for p in partials), np.zeros(n_zones + 1))
+            counts = sum((p[metric][1] for p in partials), np.zeros(n_zones + 1))
+            for zone, state in enumerate(zone_states, start=1):
+                if counts[zone]:
+                    results[state][metric] = round(float(sums[zone] / counts[zone]), 4)
+    else:
+        counts = sum(partials, np.zeros((n_zones + 1, len(DYNAMIC_WORLD_CLASSES))))
+        for zone, state in enumerate(zone_states, start=1):
+            total = counts[zone].sum()
+            if total:
+                results[state] = {cls: round(float(c / total), 4) for cls, c in zip(DYNAMIC_WORLD_CLASSES, counts[zone])}
+    return results
+
+
+def state_year_stats(states, year, kind):
+    """
+    Returns {state: {metric: value}} from the year's raster of `kind` ("spectral" or
+    "land_cover"), computing only states missing from the cache. Empty if there is no raster.
+    """
+    path = raster_path(year, SENTINEL2_RASTER if kind == "spectral" else DYNAMIC_WORLD_RASTER)
+    if not os.path.exists(path):
+        return {}
+    source = {"raster": os.path.abspath(path), "signature": file_signature(path), "shapes": file_signature(SHAPEFILE_PATH)}
+    results = {}
+    pending = []
+    for state in states:
+        cached = _cache.get(cache_key(dict(source, state=state)))
+        if cached is None:
+            pending.append(state)
+        else:
+            results[state] = cached
+    if pending:
+        computed = _compute(path, kind, pending)
+        for state in pending:
+            stats = computed.get(state, {})
+            _cache.set(cache_key(dict(source, state=state)), stats)
+            results[state] = stats
+        logger.info("Computed %s zonal statistics for %s from %s", kind, pending, path)
+    return results
+
+
+def lookup_raster_values(states, year_dict, metrics):
+    """Returns {(state, year, metric): value} for every requested cell the local rasters cover."""
+    kinds = []
+    if any(metric in SPECTRAL_INDICES for metric in metrics):
+        kinds.append("spectral")
+    if any(metric in DYNAMIC_WORLD_CLASSES for metric in metrics):
+        kinds.append("land_cover")
+    states_by_year = {}
+    for state in states:
+        for year in year_dict.get(state, [str(MAX_YEAR)]):
+            states_by_year.setdefault(str(year), []).append(state)
+
+    values = {}
+    for year, year_states in states_by_year.items():
+        for kind in kinds:
+            for state, stats in state_year_stats(year_states, year, kind).items():
+                values.update({(state, year, metric): stats[metric] for metric in metrics if metric in stats})
+    return values
+
+
+def answer_from_rasters(states, year_dict, metrics, structured=False):
+    """
+    Answers a query from the local rasters, or returns None if any requested cell is
+    not covered. The answer is laid out like answer_from_index's.
+    """
+    try:
+        values = lookup_raster_values(states, year_dict, metrics)
+    except Exception as e:
+        logger.warning("Zonal statistics failed: %s", e)
+        return None
+    for state in states:
+        for year in year_dict.get(state, [str(MAX_YEAR)]):
+            if any((state, str(year), metric) not in values for metric in metrics):
+                return None
+    if structured:
+        return format_records(values)
+    return format_values(values, states, year_dict, metrics)